@@ -10,6 +10,7 @@ from attrdict import AttrDict
 from datetime import datetime
 from twisted.internet import reactor
 from whisker.logging import configure_logger_for_colour
+from whisker.storage import TrialWriter
 from whisker.constants import DEFAULT_PORT
 from whisker.convenience import (load_config_or_die,
                                  connect_to_db_using_attrdict,
@@ -43,11 +44,12 @@ SUMMARY_TABLE = 'summary'
 # =============================================================================
 
 class MyWhiskerTask(WhiskerTask):
-    def __init__(self, config, db, session):
+    def __init__(self, config, db, writer, session):
         """Here, we initialize the task, and store any relevant variables."""
         super().__init__()  # call base class init
         self.config = config
         self.db = db
+        self.writer = writer
         self.session = session
         self.trial_num = 0
 
@@ -81,7 +83,8 @@ class MyWhiskerTask(WhiskerTask):
                 received=True,  # now we're just making things up...
                 when=now,
             )
-            insert_and_set_id(self.db[TRIAL_TABLE], trial)  # save to database
+            # Save to database, in the background (so we don't wait for it).
+            self.writer.write(TRIAL_TABLE, trial)
             self.trial_num += 1
             log.info("{} pings received so far".format(self.trial_num))
 
@@ -116,11 +119,14 @@ def main():
                        session=config.session,
                        num_pings=num_pings)
     insert_and_set_id(db[SESSION_TABLE], session)  # save to database
+    writer = TrialWriter(db)  # writes trials to the database in batches
+    writer.close_on_reactor_shutdown(reactor)  # ... all of them, at the end
     log.info("Off we go...")
-    task = MyWhiskerTask(config, db, session)
+    task = MyWhiskerTask(config, db, writer, session)
     task.connect(config.server, config.port)
     # noinspection PyUnresolvedReferences
     reactor.run()  # starts Twisted and thus network processing
+    writer.close()  # already done by the reactor, but no harm
     log.info("Finished.")
 
     # -------------------------------------------------------------------------
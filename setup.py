@@ -97,6 +97,7 @@ setup(
         'Twisted',  # TCP/IP communications
         'typing==3.5.2.2',  # part of stdlib in Python 3.5, but not 3.4
         'pyyaml',  # Yet Another Markup Language
+        # 'pyarrow',  # optional: Parquet export (convenience.export_rows)
 
         # ---------------------------------------------------------------------
         # For development only:
@@ -110,6 +111,7 @@ setup(
             # Format is 'script=module:function".
             'whisker_test_rawsockets=whisker.test_rawsockets:main',
             'whisker_test_twisted=whisker.test_twisted:main',
+            'whisker_dbdump=whisker.dbdump:main',
         ],
     },
 )
@@ -0,0 +1,61 @@
+#!/usr/bin/env python
+# tests/test_logging.py
+
+import logging
+import unittest
+
+from whisker.logging import start_async_logging, stop_async_logging
+
+
+class ListHandler(logging.Handler):
+    def __init__(self) -> None:
+        super().__init__()
+        self.messages = []
+
+    def emit(self, record: logging.LogRecord) -> None:
+        self.messages.append(record.getMessage())
+
+
+class AsyncLoggingTests(unittest.TestCase):
+    def setUp(self) -> None:
+        self.parent = logging.getLogger('whiskertest')
+        self.child = logging.getLogger('whiskertest.child')
+        self.sibling = logging.getLogger('whiskertest.sibling')
+        self.parent.setLevel(logging.INFO)
+        self.parent_handler = ListHandler()
+        self.child_handler = ListHandler()
+        self.parent.addHandler(self.parent_handler)
+        self.child.addHandler(self.child_handler)
+
+    def tearDown(self) -> None:
+        stop_async_logging()
+        self.parent.removeHandler(self.parent_handler)
+        self.child.removeHandler(self.child_handler)
+
+    def test_child_handler_scope(self) -> None:
+        start_async_logging('whiskertest')
+        self.child.info("child")
+        self.sibling.info("sibling")
+        self.parent.info("parent")
+        stop_async_logging()
+        self.assertEqual(self.child_handler.messages, ["child"])
+        self.assertEqual(self.parent_handler.messages,
+                         ["child", "sibling", "parent"])
+        # Handlers are back where they were.
+        self.assertIn(self.child_handler, self.child.handlers)
+        self.assertIn(self.parent_handler, self.parent.handlers)
+
+    def test_no_propagation(self) -> None:
+        self.child.propagate = False
+        try:
+            start_async_logging('whiskertest')
+            self.child.info("child")
+            stop_async_logging()
+        finally:
+            self.child.propagate = True
+        self.assertEqual(self.child_handler.messages, ["child"])
+        self.assertEqual(self.parent_handler.messages, [])
+
+
+if __name__ == '__main__':
+    unittest.main()
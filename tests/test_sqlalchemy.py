@@ -0,0 +1,100 @@
+#!/usr/bin/env python
+# tests/test_sqlalchemy.py
+
+from typing import Tuple
+import unittest
+
+from sqlalchemy import Column, create_engine, event, ForeignKey, Integer
+from sqlalchemy.ext.declarative import declarative_base
+from sqlalchemy.orm import relationship, sessionmaker
+
+from whisker.sqlalchemy import deepcopy_sqla_object, walk
+
+Base = declarative_base()
+
+
+class Parent(Base):
+    __tablename__ = 'parent'
+    id = Column(Integer, primary_key=True)
+    children = relationship('Child', back_populates='parent')
+
+
+class Child(Base):
+    __tablename__ = 'child'
+    id = Column(Integer, primary_key=True)
+    parent_id = Column(Integer, ForeignKey('parent.id'))
+    parent = relationship('Parent', back_populates='children')
+    toys = relationship('Toy')
+    notes = relationship('Note', lazy='dynamic')
+
+
+class Toy(Base):
+    __tablename__ = 'toy'
+    id = Column(Integer, primary_key=True)
+    child_id = Column(Integer, ForeignKey('child.id'))
+
+
+class Note(Base):
+    __tablename__ = 'note'
+    id = Column(Integer, primary_key=True)
+    child_id = Column(Integer, ForeignKey('child.id'))
+
+
+class WalkTests(unittest.TestCase):
+    def setUp(self) -> None:
+        self.engine = create_engine('sqlite://')
+        Base.metadata.create_all(self.engine)
+        self.n_queries = 0
+        event.listen(self.engine, 'before_cursor_execute', self.count_query)
+        self.Session = sessionmaker(bind=self.engine)
+
+    # noinspection PyUnusedLocal
+    def count_query(self, *args) -> None:
+        self.n_queries += 1
+
+    def add_parent(self, n_children: int) -> int:
+        session = self.Session()
+        parent = Parent(children=[Child(toys=[Toy(), Toy()], notes=[Note()])
+                                  for _ in range(n_children)])
+        session.add(parent)
+        session.commit()
+        parent_id = parent.id
+        session.close()
+        return parent_id
+
+    def count_walk(self, parent_id: int, bulk_load: bool) -> Tuple[int, int]:
+        session = self.Session()
+        self.n_queries = 0
+        objects = list(walk(session.query(Parent).get(parent_id),
+                            bulk_load=bulk_load))
+        session.close()
+        return len(objects), self.n_queries
+
+    def test_dynamic_relationship(self) -> None:
+        parent_id = self.add_parent(2)
+        session = self.Session()
+        objects = list(walk(session.query(Parent).get(parent_id)))
+        self.assertEqual(len(objects), 9)
+        copy = deepcopy_sqla_object(session.query(Parent).get(parent_id),
+                                    session)
+        session.commit()
+        self.assertEqual(len(copy.children), 2)
+        self.assertEqual(copy.children[0].notes.count(), 1)
+
+    def test_small_tree_queries(self) -> None:
+        parent_id = self.add_parent(2)
+        n_lazy, queries_lazy = self.count_walk(parent_id, bulk_load=False)
+        n_bulk, queries_bulk = self.count_walk(parent_id, bulk_load=True)
+        self.assertEqual(n_bulk, n_lazy)
+        self.assertLessEqual(queries_bulk, queries_lazy)
+
+    def test_large_tree_queries(self) -> None:
+        parent_id = self.add_parent(20)
+        n_lazy, queries_lazy = self.count_walk(parent_id, bulk_load=False)
+        n_bulk, queries_bulk = self.count_walk(parent_id, bulk_load=True)
+        self.assertEqual(n_bulk, n_lazy)
+        self.assertLess(queries_bulk, queries_lazy)
+
+
+if __name__ == '__main__':
+    unittest.main()
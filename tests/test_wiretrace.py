@@ -0,0 +1,48 @@
+#!/usr/bin/env python
+# tests/test_wiretrace.py
+
+import logging
+import unittest
+
+from whisker.wiretrace import WireTrace
+
+
+class WireTraceTests(unittest.TestCase):
+    def setUp(self) -> None:
+        self.logger = logging.getLogger('whiskertest.wiretrace')
+        self.trace = WireTrace(maxlen=10)
+
+    def dump(self, reason: str, **kwargs) -> str:
+        with self.assertLogs(self.logger, logging.WARNING) as cm:
+            self.trace.dump(reason, logger=self.logger, **kwargs)
+        self.assertEqual(len(cm.records), 1)
+        return cm.records[0].getMessage()
+
+    def test_consecutive_errors(self) -> None:
+        self.trace.record_sent("TimerSetEvent 1000 0 x")
+        self.trace.record_received("Error: one")
+        first = self.dump("error from server")
+        self.assertIn("(2 lines)", first)
+        self.assertIn("TimerSetEvent", first)
+        self.trace.record_received("Error: two")
+        second = self.dump("error from server")
+        self.assertIn("(1 new lines)", second)
+        self.assertIn("Error: two", second)
+        self.assertNotIn("Error: one", second)
+        self.assertNotIn("TimerSetEvent", second)
+        third = self.dump("disconnected")
+        self.assertIn("(0 new lines)", third)
+        everything = self.dump("all", everything=True)
+        self.assertIn("(3 lines)", everything)
+
+    def test_order(self) -> None:
+        self.trace.record_sent("a")
+        self.trace.record_received("b", "imm")
+        self.trace.record_sent("c")
+        self.assertEqual([e[3] for e in self.trace.get_entries()],
+                         ["a", "b", "c"])
+        self.assertEqual(len(self.trace.get_lines()), 3)
+
+
+if __name__ == '__main__':
+    unittest.main()
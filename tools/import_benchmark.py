@@ -0,0 +1,99 @@
+#!/usr/bin/env python
+
+"""
+Times how long it takes to import whisker modules, each in a fresh Python
+process (best of several runs), e.g.
+
+    tools/import_benchmark.py
+    tools/import_benchmark.py whisker.twistedclient --detail 15
+
+With --detail (Python 3.7+), also lists the slowest imports each module
+pulls in (cumulative time, from "python -X importtime").
+"""
+
+import argparse
+import os
+from os.path import abspath, dirname, join
+import subprocess
+import sys
+import time
+
+CURRENT_DIR = dirname(abspath(__file__))
+PROJECT_BASE_DIR = abspath(join(CURRENT_DIR, os.pardir))
+
+DEFAULT_MODULES = [
+    'whisker.api',
+    'whisker.twistedclient',
+    'whisker.qtclient',
+    'whisker.convenience',
+    'whisker.sqlalchemy',
+    'whisker.storage',
+    'whisker.random',
+    'whisker.schedule',
+]
+
+
+def get_env():
+    env = os.environ.copy()
+    env.setdefault('QT_QPA_PLATFORM', 'offscreen')
+    return env
+
+
+def time_import(module, runs):
+    """Returns the best wall-clock time to start Python and import module."""
+    best = None
+    for _ in range(runs):
+        start = time.perf_counter()
+        # Run from the project directory, so its whisker package is used.
+        subprocess.check_call([sys.executable, '-c', 'import ' + module],
+                              cwd=PROJECT_BASE_DIR, env=get_env())
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+
+def slowest_imports(module, n):
+    """Returns [(cumulative microseconds, package)] from -X importtime."""
+    result = subprocess.run(
+        [sys.executable, '-X', 'importtime', '-c', 'import ' + module],
+        cwd=PROJECT_BASE_DIR, env=get_env(), stderr=subprocess.PIPE,
+        universal_newlines=True, check=True)
+    timings = []
+    for line in result.stderr.splitlines():
+        if not line.startswith('import time:') or 'cumulative' in line:
+            continue
+        _, cumulative, name = line[len('import time:'):].split('|')
+        timings.append((int(cumulative), name.rstrip()))
+    return sorted(timings, reverse=True)[:n]
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Time imports of whisker modules in fresh processes")
+    parser.add_argument('modules', nargs='*', default=DEFAULT_MODULES,
+                        help="Modules to import (default: {})".format(
+                            " ".join(DEFAULT_MODULES)))
+    parser.add_argument('--runs', default=5, type=int,
+                        help="Runs per module; the best is shown")
+    parser.add_argument('--detail', default=0, type=int, metavar='N',
+                        help="Show the N slowest imports for each module")
+    args = parser.parse_args()
+
+    baseline = time_import('sys', args.runs)
+    print("{:<30} {:>8.1f} ms (interpreter start)".format(
+        "(python)", baseline * 1000))
+    for module in args.modules:
+        try:
+            elapsed = time_import(module, args.runs)
+        except subprocess.CalledProcessError:
+            print("{:<30} failed to import".format(module))
+            continue
+        print("{:<30} {:>8.1f} ms (+{:.1f} ms)".format(
+            module, elapsed * 1000, (elapsed - baseline) * 1000))
+        if args.detail and sys.version_info >= (3, 7):
+            for cumulative, name in slowest_imports(module, args.detail):
+                print("    {:>8.1f} ms  {}".format(cumulative / 1000, name))
+
+
+if __name__ == '__main__':
+    main()
@@ -3,31 +3,56 @@
 # Copyright (c) Rudolf Cardinal (rudolf@pobox.com).
 # See LICENSE for details.
 
+import csv
+import datetime as dt
+import gzip
+import keyword
 import logging
 from datetime import datetime
-from tkinter import filedialog, Tk
 import os
 import sys
-from typing import Any, Dict, Iterable, List, Union
-
-import arrow
-from attrdict import AttrDict
-import colorama
-from colorama import Fore, Style
-import dataset
-# noinspection PyPackageRequirements
-import yaml  # from pyyaml
+from typing import (Any, Dict, Iterable, List, Mapping, Tuple, TYPE_CHECKING,
+                    Union)
 
 from whisker.constants import FILENAME_SAFE_ISOFORMAT
+from whisker.exceptions import ImproperlyConfigured
+from whisker.lang import chunks
+
+# The third-party packages used here (tkinter, attrdict, colorama, dataset,
+# yaml, pyarrow) are imported by the functions that need them, so importing
+# this module is quick.
+if TYPE_CHECKING:
+    import arrow  # for type hints
+    from attrdict import AttrDict  # for type hints
+    import dataset  # for type hints
+    import pyarrow  # for type hints
 
 log = logging.getLogger(__name__)
 log.addHandler(logging.NullHandler())
-colorama.init()
+colorama_initialized = False
+
+
+def init_colorama() -> None:
+    """Calls colorama.init(), once, for functions that print in colour."""
+    global colorama_initialized
+    if not colorama_initialized:
+        import colorama
+        colorama.init()
+        colorama_initialized = True
+
+
+def is_arrow(value: Any) -> bool:
+    """
+    Is value an Arrow object? If the arrow package hasn't been imported, it
+    can't be, so we don't import it to find out.
+    """
+    arrow = sys.modules.get('arrow')
+    return arrow is not None and isinstance(value, arrow.Arrow)
 
 
 def load_config_or_die(mandatory: Iterable[Union[str, List[Any]]] = None,
                        defaults: Dict[str, Any] = None,
-                       log_config: bool = False) -> AttrDict:
+                       log_config: bool = False) -> 'AttrDict':
     """
     Offers a GUI file prompt; loads a YAML config from it; or exits.
 
@@ -36,6 +61,11 @@ def load_config_or_die(mandatory: Iterable[Union[str, List[Any]]] = None,
             of attributes
     defaults: a dict-like object of defaults
     """
+    from tkinter import filedialog, Tk
+    from attrdict import AttrDict
+    # noinspection PyPackageRequirements
+    import yaml  # from pyyaml
+
     def _fail_mandatory(attrname_):
         errmsg = "Setting '{}' missing from config file".format(attrname_)
         log.critical(errmsg)
@@ -81,6 +111,8 @@ def connect_to_db_using_attrdict(database_url: str,
     Connects to a dataset database, and uses AttrDict as the row type, so
     AttrDict objects come back out again.
     """
+    from attrdict import AttrDict
+    import dataset
     if show_url:
         log.info("Connecting to database: {}".format(database_url))
     else:
@@ -89,6 +121,160 @@ def connect_to_db_using_attrdict(database_url: str,
                            engine_kwargs=engine_kwargs)
 
 
+def connect_to_db_using_fast_rows(database_url: str,
+                                  show_url: bool = False,
+                                  engine_kwargs: Dict[str, Any] = None):
+    """
+    Connects to a dataset database, with rows that allow attribute access
+    like AttrDict but are much quicker to create and smaller; see
+    SlotsRowFactory. Use this for reading lots of rows, e.g. for summaries.
+    """
+    import dataset
+    if show_url:
+        log.info("Connecting to database: {}".format(database_url))
+    else:
+        log.info("Connecting to database")
+    return dataset.connect(database_url, row_type=SlotsRowFactory(),
+                           engine_kwargs=engine_kwargs)
+
+
+# =============================================================================
+# Fast row types for dataset
+# =============================================================================
+# dataset makes each row by calling row_type(row.items()). AttrDict is a
+# dictionary that also wraps its values on access; for big reads, making
+# them is the main cost.
+
+class SlotsRow(object):
+    """
+    Base class for rows whose values are in __slots__ (one class per set of
+    column names; see SlotsRowFactory). Read-only dictionary methods are
+    provided, so rows can be used like dataset's usual (dictionary) rows.
+    """
+    __slots__ = ()
+    _fields = ()  # type: Tuple[str, ...]
+
+    def keys(self) -> List[str]:
+        return list(self._fields)
+
+    def values(self) -> List[Any]:
+        return [getattr(self, k) for k in self._fields]
+
+    def items(self) -> List[Tuple[str, Any]]:
+        return list(zip(self._fields, self.values()))
+
+    def get(self, key: str, default: Any = None) -> Any:
+        if key in self._fields:
+            return getattr(self, key)
+        return default
+
+    def __getitem__(self, key: str) -> Any:
+        if key in self._fields:
+            return getattr(self, key)
+        raise KeyError(key)
+
+    def __contains__(self, key: str) -> bool:
+        return key in self._fields
+
+    def __iter__(self):
+        return iter(self._fields)
+
+    def __len__(self) -> int:
+        return len(self._fields)
+
+    def __eq__(self, other: Any) -> bool:
+        if isinstance(other, (SlotsRow, Mapping)):
+            return dict(self.items()) == dict(other.items())
+        return NotImplemented
+
+    def __repr__(self) -> str:
+        return "{}({})".format(
+            type(self).__name__,
+            ", ".join("{}={}".format(k, repr(v)) for k, v in self.items()))
+
+
+class DictRow(dict):
+    """
+    Dictionary row with attribute access (not recursive, unlike AttrDict),
+    for column names that can't be slots.
+    """
+    def __getattr__(self, key: str) -> Any:
+        try:
+            return self[key]
+        except KeyError:
+            raise AttributeError(key)
+
+
+class RowShapeMismatch(Exception):
+    pass
+
+
+def make_slots_row_class(fields: Tuple[str, ...]) -> type:
+    """
+    Makes a SlotsRow subclass for these column names, or returns DictRow if
+    they won't do as attribute names.
+
+    The class is made from (key, value) pairs, and raises RowShapeMismatch
+    (or ValueError) if the keys aren't its fields. Its __init__ is generated
+    code, so that making a row is a single unpacking assignment.
+    """
+    for f in fields:
+        if (not f.isidentifier() or keyword.iskeyword(f) or
+                f.startswith("_") or hasattr(SlotsRow, f)):
+            return DictRow
+    if not fields:
+        return DictRow
+    source = (
+        "def __init__(self, items):\n"
+        "    ({targets},) = items\n"
+        "    if {mismatch}:\n"
+        "        raise RowShapeMismatch()\n"
+    ).format(
+        targets=", ".join("(k{}, self.{})".format(i, f)
+                          for i, f in enumerate(fields)),
+        mismatch=" or ".join("k{} != {}".format(i, repr(f))
+                             for i, f in enumerate(fields)),
+    )
+    namespace = {'RowShapeMismatch': RowShapeMismatch}
+    exec(source, namespace)
+    return type("SlotsRow_" + "_".join(fields)[:50], (SlotsRow, ), {
+        '__slots__': fields,
+        '_fields': fields,
+        '__init__': namespace['__init__'],
+    })
+
+
+class SlotsRowFactory(object):
+    """
+    A dataset row_type that makes SlotsRow objects, with a class per set of
+    column names. Rows are read-only dictionaries, with attribute access; you
+    can change existing attributes, but not add new ones.
+
+    Successive rows usually come from the same query, so we try the last
+    class first.
+    """
+
+    def __init__(self) -> None:
+        self._classes = {}  # type: Dict[Tuple[str, ...], type]
+        self._last = DictRow
+
+    def __call__(self, items: Iterable[Tuple[str, Any]]) -> Any:
+        if not isinstance(items, (list, tuple)):
+            items = list(items)
+        if self._last is not DictRow:
+            try:
+                return self._last(items)
+            except (RowShapeMismatch, ValueError):
+                pass
+        fields = tuple([k for k, _ in items])
+        cls = self._classes.get(fields)
+        if cls is None:
+            cls = make_slots_row_class(fields)
+            self._classes[fields] = cls
+        self._last = cls
+        return cls(items)
+
+
 # noinspection PyShadowingBuiltins
 def ask_user(prompt: str,
              default: Any = None,
@@ -101,6 +287,8 @@ def ask_user(prompt: str,
     Prompts the user, optionally with a default, range or set of options.
     Coerces the return type.
     """
+    from colorama import Fore, Style
+    init_colorama()
     options = options or []
     defstr = ""
     minmaxstr = ""
@@ -141,14 +329,18 @@ def ask_user(prompt: str,
 
 
 def save_data(tablename: str,
-              results: List[Dict[str, Any]],
+              results: Iterable[Mapping[str, Any]],
               taskname: str,
-              timestamp: Union[arrow.Arrow, datetime] = None,
-              output_format: str = "csv"):
+              timestamp: Union['arrow.Arrow', datetime] = None,
+              output_format: str = "csv",
+              compress: bool = False):
     """
     Saves a dataset result set to a suitable output file.
-    output_format can be one of: csv, json, tabson
+    output_format can be one of: csv, parquet, json, tabson
         (see https://dataset.readthedocs.org/en/latest/api.html#dataset.freeze)
+    CSV and Parquet are written a chunk at a time (see export_rows()), so
+    results can be an iterator, e.g. straight from a dataset find().
+    If compress is True, CSV files are gzipped.
     """
     if timestamp is None:
         timestamp = datetime.utcnow()
@@ -158,15 +350,195 @@ def save_data(tablename: str,
         datetime=timestamp.strftime(FILENAME_SAFE_ISOFORMAT),
         output_format=output_format
     )
+    if compress and output_format == "csv":
+        filename += ".gz"
     log.info("Saving {tablename} data to {filename}".format(
         tablename=tablename, filename=filename))
-    dataset.freeze(results, format=output_format, filename=filename)
+    if output_format in ("csv", "parquet"):
+        export_rows(results, filename, output_format=output_format,
+                    compress=compress)
+    else:
+        import dataset
+        dataset.freeze(results, format=output_format, filename=filename)
     if not os.path.isfile(filename):
         log.error(
             "save_data: file {} not created; empty results?".format(filename))
 
 
-def insert_and_set_id(table: dataset.Table,
+# =============================================================================
+# Streaming export
+# =============================================================================
+
+DEFAULT_EXPORT_CHUNK_SIZE = 10000
+
+
+def export_rows(rows: Iterable[Mapping[str, Any]],
+                filename: str,
+                output_format: str = "csv",
+                compress: bool = False,
+                chunk_size: int = DEFAULT_EXPORT_CHUNK_SIZE,
+                schema: 'pyarrow.Schema' = None) -> int:
+    """
+    Writes rows (dictionaries, dataset rows, or SQLAlchemy result rows) to a
+    CSV or Parquet file, chunk_size rows at a time, so the rows needn't all
+    be in memory; e.g. pass a dataset find() or SQLAlchemy result directly.
+
+    The columns, and for Parquet their types, are taken from the first
+    chunk. (Parquet columns with only NULLs in the first chunk are stored as
+    text.) If a column's type changes later on (e.g. ints, then floats), pass
+    a pyarrow schema to give the Parquet columns and their types instead.
+    If compress is True, CSV is gzipped; Parquet is always compressed.
+    Parquet needs pyarrow.
+
+    Returns the number of rows. No file is created if there are no rows.
+    """
+    if output_format == "csv":
+        return export_rows_csv(rows, filename, compress=compress,
+                               chunk_size=chunk_size)
+    if output_format == "parquet":
+        return export_rows_parquet(rows, filename, chunk_size=chunk_size,
+                                   schema=schema)
+    raise ValueError("Bad output_format: {}".format(repr(output_format)))
+
+
+def export_value(value: Any) -> Any:
+    """Converts Arrow values to datetimes; leaves others alone."""
+    if is_arrow(value):
+        return value.datetime
+    return value
+
+
+def get_row_values(row: Mapping[str, Any], columns: List[str]) -> List[Any]:
+    """
+    Returns the row's values for the columns; missing keys give None, for
+    rows that are dictionaries.
+    """
+    if isinstance(row, dict):
+        return [row.get(c) for c in columns]
+    return [row[c] for c in columns]
+
+
+def get_export_columns(chunk: List[Mapping[str, Any]],
+                       columns: List[str]) -> Dict[str, List[Any]]:
+    """Returns {column: list of values} for a chunk of rows."""
+    values = [get_row_values(row, columns) for row in chunk]
+    return {c: [export_value(v[i]) for v in values]
+            for i, c in enumerate(columns)}
+
+
+def csv_export_value(value: Any) -> Any:
+    """Converts a value for csv.writer: NULL is blank; dates are ISO-8601."""
+    if value is None:
+        return ""
+    if is_arrow(value):
+        return value.isoformat()
+    if isinstance(value, (dt.date, dt.time)):
+        return value.isoformat()
+    return value
+
+
+def export_rows_csv(rows: Iterable[Mapping[str, Any]],
+                    filename: str,
+                    compress: bool = False,
+                    chunk_size: int = DEFAULT_EXPORT_CHUNK_SIZE) -> int:
+    """
+    Writes rows to a CSV file, with a header row; see export_rows(). If
+    writing fails, the partly written file is deleted.
+    """
+    n_rows = 0
+    f = None
+    try:
+        for chunk in chunks(rows, chunk_size):
+            if f is None:
+                columns = list(chunk[0].keys())
+                if compress:
+                    f = gzip.open(filename, 'wt', encoding='utf-8',
+                                  newline='')
+                else:
+                    f = open(filename, 'w', encoding='utf-8', newline='')
+                writer = csv.writer(f)
+                writer.writerow(columns)
+            writer.writerows([csv_export_value(v)
+                              for v in get_row_values(row, columns)]
+                             for row in chunk)
+            n_rows += len(chunk)
+        if f is not None:
+            f.close()  # in here, since the final write can fail too
+    except BaseException:
+        # Don't leave a truncated file behind.
+        if f is not None:
+            try:
+                f.close()
+            finally:
+                os.remove(filename)
+        raise
+    return n_rows
+
+
+def export_rows_parquet(rows: Iterable[Mapping[str, Any]],
+                        filename: str,
+                        chunk_size: int = DEFAULT_EXPORT_CHUNK_SIZE,
+                        schema: 'pyarrow.Schema' = None) -> int:
+    """
+    Writes rows to a Parquet file, one row group per chunk; see
+    export_rows().
+
+    If a chunk doesn't fit the schema, ValueError is raised, and the
+    partly written file is deleted.
+    """
+    try:
+        import pyarrow
+        import pyarrow.parquet
+    except ImportError:
+        raise ImproperlyConfigured("pyarrow is required for Parquet export")
+    n_rows = 0
+    writer = None
+    text_columns = set()
+    try:
+        for chunk in chunks(rows, chunk_size):
+            if writer is None:
+                if schema is None:
+                    columns = list(chunk[0].keys())
+                    first = pyarrow.Table.from_pydict(
+                        get_export_columns(chunk, columns))
+                    text_columns = set(
+                        field.name for field in first.schema
+                        if pyarrow.types.is_null(field.type))
+                    schema = pyarrow.schema([
+                        pyarrow.field(field.name, pyarrow.string())
+                        if field.name in text_columns else field
+                        for field in first.schema
+                    ])
+                else:
+                    columns = schema.names
+                writer = pyarrow.parquet.ParquetWriter(filename, schema)
+            data = get_export_columns(chunk, columns)
+            for c in text_columns:
+                data[c] = [None if v is None else str(v) for v in data[c]]
+            try:
+                # from_pydict(data, schema=schema) would silently truncate
+                # e.g. 1.5 to 1 for an integer column; a cast checks.
+                table = pyarrow.Table.from_pydict(data).cast(schema)
+            except (pyarrow.ArrowException, TypeError, ValueError) as e:
+                raise ValueError(
+                    "Rows {}-{} don't fit the Parquet schema (taken from the "
+                    "first chunk unless you pass one): {}".format(
+                        n_rows + 1, n_rows + len(chunk), e))
+            writer.write_table(table)
+            n_rows += len(chunk)
+    except BaseException:
+        if writer is not None:
+            writer.close()
+            writer = None
+            os.remove(filename)
+        raise
+    finally:
+        if writer is not None:
+            writer.close()
+    return n_rows
+
+
+def insert_and_set_id(table: 'dataset.Table',
                       obj: Dict[str, Any],
                       idfield: str = 'id') -> Any:  # but typically int
     """The dataset table's insert() command returns the primary key.
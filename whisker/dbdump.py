@@ -0,0 +1,288 @@
+#!/usr/bin/env python
+# whisker/dbdump.py
+# Copyright (c) Rudolf Cardinal (rudolf@pobox.com).
+# See LICENSE for details.
+
+"""
+Dumps a database as SQL: one gzipped file for the schema, and one per table
+of INSERT statements, plus a JSON manifest saying what order to load them in.
+
+Tables are written in foreign-key dependency order (tables before the tables
+that refer to them), so loading the files in manifest order doesn't break
+FK constraints (barring cycles, which are reported). Tables are read
+concurrently, over several connections.
+
+Data can also be written as CSV. And with a state file, tables can be dumped
+incrementally: for each table given a "watermark" column, only rows with
+values above those dumped last time are written (see
+whisker.sqlalchemy.dump_table_increment).
+"""
+
+import argparse
+from concurrent.futures import ThreadPoolExecutor
+import datetime
+import gzip
+import json
+import logging
+import os
+from typing import Any, Dict, List, Tuple
+
+from sqlalchemy import create_engine, MetaData, sql, Table
+from sqlalchemy.engine.base import Engine  # for type hints
+from sqlalchemy.engine.url import make_url
+
+from whisker.logging import configure_logger_for_colour
+from whisker.sqlalchemy import (
+    bulk_insert_extras,
+    dump_ddl,
+    dump_query_as_csv,
+    dump_table_as_insert_sql,
+    dump_table_increment,
+    load_watermarks,
+    reflect_table,
+    save_watermarks,
+    sql_comment,
+    watermark_to_json,
+)
+from whisker.lang import writeline_nl
+
+log = logging.getLogger(__name__)
+
+MANIFEST_FILENAME = "manifest.json"
+SCHEMA_FILENAME = "000_schema.sql.gz"
+DEFAULT_JOBS = 4
+
+
+# =============================================================================
+# Table order
+# =============================================================================
+
+def get_dependency_levels(tables: List[Table]) -> Dict[str, int]:
+    """
+    Returns {table name: level}, where a table's level is one more than the
+    highest level of the tables its foreign keys refer to (0 for tables
+    without FKs, and ignoring self-references and tables not in the list).
+    The tables should be in dependency order, e.g. MetaData.sorted_tables.
+    """
+    names = set(t.name for t in tables)
+    levels = {}  # type: Dict[str, int]
+    for table in tables:
+        referenced = set(fk.column.table.name for fk in table.foreign_keys)
+        referenced = (referenced & names) - {table.name}
+        levels[table.name] = 1 + max(
+            [levels.get(r, 0) for r in referenced], default=-1)
+    return levels
+
+
+# =============================================================================
+# Dumping
+# =============================================================================
+
+def get_table_filename(order: int, table_name: str,
+                       output_format: str = "sql") -> str:
+    return "{:03d}_{}.{}.gz".format(order, table_name, output_format)
+
+
+def dump_schema(metadata: MetaData, dialect_name: str, filename: str) -> None:
+    with gzip.open(filename, 'wt', encoding='utf-8') as f:
+        dump_ddl(metadata, dialect_name=dialect_name, fileobj=f)
+
+
+def dump_table(engine: Engine, table_name: str, filename: str,
+               output_format: str = "sql",
+               multirow: bool = True,
+               rows_per_insert: int = 1000,
+               watermark_column: str = None,
+               after: Any = None) -> Tuple[int, Any]:
+    """
+    Writes a table's data to a gzipped SQL or CSV file. If watermark_column
+    is given, only rows with values above after are written.
+
+    Returns (number of rows, new watermark or None).
+    """
+    upto = None
+    # newline='' is right for CSV, and harmless for SQL.
+    with gzip.open(filename, 'wt', encoding='utf-8', newline='') as f:
+        if output_format == "sql":
+            bulk_insert_extras(engine.dialect.name, f, start=True)
+        if watermark_column:
+            n_rows, upto = dump_table_increment(
+                engine, table_name, watermark_column, f, after=after,
+                output_format=output_format, multirow=multirow,
+                rows_per_insert=rows_per_insert)
+        elif output_format == "csv":
+            table = reflect_table(engine, table_name)
+            n_rows = dump_query_as_csv(engine, table,
+                                       sql.select(table.columns), f)
+        else:
+            n_rows = dump_table_as_insert_sql(engine, table_name, f,
+                                              multirow=multirow,
+                                              rows_per_insert=rows_per_insert)
+        if output_format == "sql":
+            bulk_insert_extras(engine.dialect.name, f, start=False)
+            writeline_nl(f, sql_comment("{} rows".format(n_rows)))
+    log.info("Dumped {} rows from {}".format(n_rows, table_name))
+    return n_rows, upto
+
+
+def dump_database(engine: Engine,
+                  output_dir: str,
+                  table_names: List[str] = None,
+                  jobs: int = DEFAULT_JOBS,
+                  include_schema: bool = True,
+                  output_format: str = "sql",
+                  multirow: bool = True,
+                  rows_per_insert: int = 1000,
+                  watermark_columns: Dict[str, str] = None,
+                  state_filename: str = None) -> Dict[str, Any]:
+    """
+    Dumps the database (or just the named tables) to output_dir, as above.
+    Returns the manifest, which is also written to output_dir.
+
+    For incremental dumps, watermark_columns is {table name: column name}
+    and state_filename is the file (see load_watermarks()) that remembers
+    how far we got; it's only updated once everything has been written.
+    """
+    if output_format not in ("sql", "csv"):
+        raise ValueError("Bad output_format: {}".format(repr(output_format)))
+    watermark_columns = watermark_columns or {}
+    if watermark_columns and not state_filename:
+        raise ValueError("Incremental dumps need a state file")
+    state = load_watermarks(state_filename) if state_filename else {}
+    os.makedirs(output_dir, exist_ok=True)
+    metadata = MetaData()
+    metadata.reflect(engine, only=table_names)
+    tables = metadata.sorted_tables  # warns about FK cycles
+    if table_names:
+        # Reflection also brings in tables referred to by FKs.
+        tables = [t for t in tables if t.name in table_names]
+    levels = get_dependency_levels(tables)
+    manifest = {
+        'created': datetime.datetime.utcnow().isoformat() + "Z",
+        'database': repr(make_url(str(engine.url))),  # hides password
+        'dialect': engine.dialect.name,
+        'schema': None,
+        'tables': [],
+    }  # type: Dict[str, Any]
+
+    if include_schema:
+        log.info("Dumping schema")
+        dump_schema(metadata, engine.dialect.name,
+                    os.path.join(output_dir, SCHEMA_FILENAME))
+        manifest['schema'] = SCHEMA_FILENAME
+
+    with ThreadPoolExecutor(max_workers=jobs) as executor:
+        futures = []
+        for order, table in enumerate(tables, start=1):
+            filename = get_table_filename(order, table.name, output_format)
+            column = watermark_columns.get(table.name)
+            after = None
+            if column:
+                previous = state.get(table.name)
+                if previous and previous['column'] == column:
+                    after = previous['watermark']
+                elif previous:
+                    log.warning("{}: watermark column changed from {} to {}; "
+                                "dumping all rows".format(
+                                    table.name, previous['column'], column))
+            futures.append((order, table.name, filename, column, after,
+                            executor.submit(
+                                dump_table, engine, table.name,
+                                os.path.join(output_dir, filename),
+                                output_format=output_format,
+                                multirow=multirow,
+                                rows_per_insert=rows_per_insert,
+                                watermark_column=column,
+                                after=after)))
+        for order, table_name, filename, column, after, future in futures:
+            n_rows, upto = future.result()  # re-raises any exception
+            entry = {
+                'order': order,
+                'level': levels[table_name],
+                'table': table_name,
+                'file': filename,
+                'rows': n_rows,
+            }
+            if column:
+                entry['watermark_column'] = column
+                entry['after'] = watermark_to_json(after)
+                entry['upto'] = watermark_to_json(upto)
+                state[table_name] = {'column': column, 'watermark': upto}
+            manifest['tables'].append(entry)
+
+    with open(os.path.join(output_dir, MANIFEST_FILENAME), 'w') as f:
+        json.dump(manifest, f, indent=4)
+    if watermark_columns:
+        save_watermarks(state_filename, state)
+    return manifest
+
+
+# =============================================================================
+# Command-line entry point
+# =============================================================================
+
+def main() -> None:
+    logging.basicConfig()
+    configure_logger_for_colour(logging.getLogger())  # configure root logger
+
+    parser = argparse.ArgumentParser(
+        description="Dump a database as gzipped SQL files (schema, and data "
+                    "per table in foreign-key order), plus a manifest")
+    parser.add_argument('url', help="SQLAlchemy database URL")
+    parser.add_argument('output_dir', help="Directory to write to")
+    parser.add_argument('--tables', nargs='*',
+                        help="Tables to dump (default: all)")
+    parser.add_argument('--jobs', default=DEFAULT_JOBS, type=int,
+                        help="Number of tables to dump at once "
+                             "(default: {})".format(DEFAULT_JOBS))
+    parser.add_argument('--no_schema', action='store_true',
+                        help="Don't dump the schema (CREATE TABLE)")
+    parser.add_argument('--single_row', action='store_true',
+                        help="One INSERT per row (default: multi-row INSERT "
+                             "statements, where the dialect supports them)")
+    parser.add_argument('--rows_per_insert', default=1000, type=int,
+                        help="Rows per multi-row INSERT (default: 1000)")
+    parser.add_argument('--format', default="sql", choices=["sql", "csv"],
+                        help="Data format (default: sql)")
+    parser.add_argument('--watermark', action='append', default=[],
+                        metavar="TABLE=COLUMN",
+                        help="Dump only rows of TABLE whose COLUMN (an "
+                             "ever-increasing value, e.g. an autoincrement "
+                             "PK or insertion timestamp) is above the value "
+                             "reached last time; needs --state_file. May be "
+                             "repeated.")
+    parser.add_argument('--state_file',
+                        help="JSON file recording watermarks between runs")
+    parser.add_argument('--verbose', action='store_true',
+                        help="Verbose logging")
+    args = parser.parse_args()
+    watermark_columns = {}
+    for w in args.watermark:
+        table_name, sep, column = w.partition("=")
+        if not sep or not table_name or not column:
+            parser.error("Bad --watermark: {}".format(w))
+        watermark_columns[table_name] = column
+    if watermark_columns and not args.state_file:
+        parser.error("--watermark needs --state_file")
+    logging.getLogger("whisker").setLevel(
+        logging.DEBUG if args.verbose else logging.INFO)
+
+    engine_kwargs = {}
+    if not args.url.startswith("sqlite:"):  # SQLite doesn't pool files
+        engine_kwargs['pool_size'] = max(args.jobs, 5)
+    engine = create_engine(args.url, **engine_kwargs)
+    manifest = dump_database(engine, args.output_dir,
+                             table_names=args.tables,
+                             jobs=args.jobs,
+                             include_schema=not args.no_schema,
+                             output_format=args.format,
+                             multirow=not args.single_row,
+                             rows_per_insert=args.rows_per_insert,
+                             watermark_columns=watermark_columns,
+                             state_filename=args.state_file)
+    log.info("Dumped {} tables to {}".format(len(manifest['tables']),
+                                             args.output_dir))
+
+
+if __name__ == '__main__':
+    main()
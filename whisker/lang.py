@@ -12,8 +12,8 @@ import re
 import subprocess
 import sys
 import types
-from typing import (Any, Dict, Iterable, List, Match, Optional, Pattern,
-                    TextIO, Union)
+from typing import (Any, Dict, Generator, Iterable, List, Match, Optional,
+                    Pattern, TextIO, Union)
 
 log = logging.getLogger(__name__)
 
@@ -51,11 +51,58 @@ def sort_list_by_index_list(x: List[Any], indexes: List[int]) -> None:
     x[:] = [x[i] for i in indexes]
 
 
+def apply_permutation(x: List[Any], indexes: List[int],
+                      start: int = 0) -> None:
+    """
+    Re-orders x in place, such that x[start + k] becomes the old
+    x[indexes[k]]. indexes must be a permutation of
+    range(start, start + len(indexes)); the rest of x is untouched.
+
+    Follows the permutation's cycles, so moves each item once without
+    copying the list (cf. sort_list_by_index_list).
+    """
+    n = len(indexes)
+    if start < 0 or start + n > len(x):
+        raise ValueError("Permutation doesn't fit the list")
+    done = bytearray(n)
+    for i in indexes:
+        offset = i - start
+        if not 0 <= offset < n or done[offset]:
+            raise ValueError("Not a permutation: {}".format(i))
+        done[offset] = 1
+    done = bytearray(n)
+    for k in range(n):
+        if done[k]:
+            continue
+        first = x[start + k]
+        j = k
+        while True:
+            done[j] = 1
+            source = indexes[j] - start
+            if source == k:
+                x[start + j] = first
+                break
+            x[start + j] = x[start + source]
+            j = source
+
+
 def flatten_list(x: List[Any]) -> List[Any]:
     return [item for sublist in x for item in sublist]
     # http://stackoverflow.com/questions/952914/making-a-flat-list-out-of-list-of-lists-in-python  # noqa
 
 
+def chunks(x: Iterable[Any], n: int) -> Generator[List[Any], None, None]:
+    """Yields lists of up to n consecutive items from x."""
+    chunk = []
+    for item in x:
+        chunk.append(item)
+        if len(chunk) >= n:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
 # =============================================================================
 # Number printing, e.g. for parity
 # =============================================================================
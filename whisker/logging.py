@@ -3,10 +3,14 @@
 # Copyright (c) Rudolf Cardinal (rudolf@pobox.com).
 # See LICENSE for details.
 
+import atexit
+from collections import OrderedDict
 from html import escape
 import json
 import logging
-from typing import Any, Callable, Dict, Optional
+from logging.handlers import QueueHandler, QueueListener
+import queue
+from typing import Any, Callable, Dict, List, Optional, Tuple
 
 from colorlog import ColoredFormatter
 
@@ -37,6 +41,12 @@ USER CODE should use the following general methods.
     from whisker.log import configure_logger_for_colour
     configure_logger_for_colour(rootlogger)
 
+(d) Keeping log formatting and I/O out of network/task threads:
+
+    # ... configure handlers as above, then:
+    from whisker.logging import start_async_logging
+    start_async_logging()
+
 
 LIBRARY CODE should use the following general methods.
 
@@ -303,3 +313,159 @@ class HtmlColorHandler(logging.StreamHandler):
             self.logfunction(html)
         except:
             self.handleError(record)
+
+
+# =============================================================================
+# Asynchronous logging: records go via a queue to a single listener thread
+# =============================================================================
+# https://docs.python.org/3.4/howto/logging-cookbook.html#dealing-with-handlers-that-block  # noqa
+
+def get_propagation_loggers(name: str) -> List[logging.Logger]:
+    """
+    Returns the logger with this name and those that its records propagate
+    to, in order.
+    """
+    lg = logging.getLogger(name)
+    loggers = [lg]
+    while lg.propagate and lg.parent is not None:
+        lg = lg.parent
+        loggers.append(lg)
+    return loggers
+
+
+class AsyncLogListener(QueueListener):
+    """
+    QueueListener that respects the levels of its handlers (as the
+    respect_handler_level option does in Python 3.5+).
+
+    A handler with an entry in handler_loggers gets only records that would
+    have reached one of those loggers anyway (e.g. a handler that was on
+    "whisker.twistedclient" doesn't get records from "whisker.qt").
+    """
+    def __init__(self, queue_: queue.Queue, *handlers) -> None:
+        super().__init__(queue_, *handlers)
+        self.handler_loggers = {}  # type: Dict[logging.Handler, List[logging.Logger]]  # noqa
+
+    def handle(self, record: logging.LogRecord) -> None:
+        record = self.prepare(record)
+        reached = None
+        for handler in self.handlers:
+            if record.levelno < handler.level:
+                continue
+            loggers = self.handler_loggers.get(handler)
+            if loggers:
+                if reached is None:
+                    reached = get_propagation_loggers(record.name)
+                if not any(lg in reached for lg in loggers):
+                    continue
+            handler.handle(record)
+
+
+_async_listener = None  # type: Optional[AsyncLogListener]
+_async_queue_handler = None  # type: Optional[QueueHandler]
+_async_logger = None  # type: Optional[logging.Logger]
+_async_old_propagate = True
+_async_moved_handlers = []  # type: List[Tuple[logging.Logger, logging.Handler]]  # noqa
+_async_atexit_registered = False
+
+
+def start_async_logging(logger_name: str = 'whisker') -> AsyncLogListener:
+    """
+    Sends all records from the named logger and its children (by default,
+    all "whisker.*" logs) through a QueueHandler. The logging thread (e.g. a
+    network or task thread) then only pays for putting the record on a queue;
+    a single listener thread does the formatting and I/O for the real
+    handlers (the colour console handler, file handlers from
+    copy_all_logs_to_file(), HtmlColorHandler sinks, and so on).
+
+    The real handlers are those currently attached to the named logger, its
+    descendants, and the root logger, so call this AFTER setting up your
+    handlers. Each still gets only the records it got before (e.g. a handler
+    on "whisker.twistedclient" doesn't start getting "whisker.qt" records).
+    Handlers on a logger whose records don't propagate as far as the named
+    logger stay where they are, and are called directly.
+    Use add_async_log_handler() for any handlers created later; they get
+    every record. The named logger stops propagating to the root logger (or
+    records would reach the root handlers twice).
+
+    Should ONLY be called from the "if __name__ == 'main'" script:
+        https://docs.python.org/3.4/howto/logging.html#library-config
+    """
+    global _async_listener, _async_queue_handler, _async_logger
+    global _async_old_propagate, _async_moved_handlers
+    global _async_atexit_registered
+    if _async_listener is not None:
+        return _async_listener
+
+    named_log = logging.getLogger(logger_name)
+    prefix = logger_name + '.'
+    loggers = [named_log]
+    # noinspection PyUnresolvedReferences
+    for name, obj in logging.Logger.manager.loggerDict.items():
+        # Records that stop short of the named logger (propagate = False
+        # on the way) never reach the queue; leave those handlers be.
+        if (name.startswith(prefix) and isinstance(obj, logging.Logger) and
+                named_log in get_propagation_loggers(name)):
+            loggers.append(obj)
+    handler_loggers = OrderedDict()  # type: Dict[logging.Handler, List[logging.Logger]]  # noqa
+    moved = []  # type: List[Tuple[logging.Logger, logging.Handler]]
+    for lg in loggers:
+        for h in list(lg.handlers):
+            if isinstance(h, logging.NullHandler):
+                continue
+            lg.removeHandler(h)
+            moved.append((lg, h))
+            handler_loggers.setdefault(h, []).append(lg)
+    if named_log.propagate:
+        # Root handlers get whatever reaches the named logger.
+        for h in logging.getLogger().handlers:
+            handler_loggers.setdefault(h, []).append(named_log)
+
+    q = queue.Queue()  # unbounded, so put() never blocks the caller
+    _async_queue_handler = QueueHandler(q)
+    _async_listener = AsyncLogListener(q, *handler_loggers.keys())
+    _async_listener.handler_loggers = handler_loggers
+    _async_logger = named_log
+    _async_old_propagate = named_log.propagate
+    _async_moved_handlers = moved
+    named_log.addHandler(_async_queue_handler)
+    named_log.propagate = False
+    _async_listener.start()
+    if not _async_atexit_registered:
+        atexit.register(stop_async_logging)
+        _async_atexit_registered = True
+    return _async_listener
+
+
+def add_async_log_handler(handler: logging.Handler) -> None:
+    """
+    Adds a handler (e.g. a LogWindow's HtmlColorHandler) to the listener
+    started by start_async_logging().
+    """
+    if _async_listener is None:
+        raise RuntimeError("Asynchronous logging has not been started")
+    if handler not in _async_listener.handlers:
+        # Reassignment, not mutation, so the listener thread is never
+        # iterating over a changing sequence.
+        _async_listener.handlers = _async_listener.handlers + (handler, )
+
+
+def stop_async_logging() -> None:
+    """
+    Processes any records still on the queue, stops the listener thread, and
+    restores the handlers that start_async_logging() moved.
+    Called automatically at exit.
+    """
+    global _async_listener, _async_queue_handler, _async_logger
+    global _async_moved_handlers
+    if _async_listener is None:
+        return
+    _async_listener.stop()  # handles everything already queued
+    _async_logger.removeHandler(_async_queue_handler)
+    _async_logger.propagate = _async_old_propagate
+    for lg, h in _async_moved_handlers:
+        lg.addHandler(h)
+    _async_listener = None
+    _async_queue_handler = None
+    _async_logger = None
+    _async_moved_handlers = []
@@ -4,13 +4,15 @@
 # See LICENSE for details.
 
 
+from collections import deque
 from functools import wraps
 import gc
 import logging
 import sys
 import threading
 import traceback
-from typing import Any, Iterable, List, Optional, Tuple
+from typing import (Any, Dict, Iterable, List, Optional, Tuple,
+                    TYPE_CHECKING)
 
 # noinspection PyPackageRequirements
 from PyQt5.QtCore import (
@@ -54,13 +56,16 @@ from PyQt5.QtWidgets import (
     QVBoxLayout,
     QWidget,
 )
-from sqlalchemy.orm import Session  # for type hints
+
+# SQLAlchemy is only needed by the database dialogs and models; it's
+# imported when they're used, so Qt clients can start without it.
+if TYPE_CHECKING:
+    from sqlalchemy.orm import Query, Session  # for type hints
+    from sqlalchemy.sql.elements import ColumnElement  # for type hints
 
 from whisker.lang import (
-    attrgetter_nonesort,
     contains_duplicates,
     get_caller_name,
-    methodcaller_nonesort,
 )
 from whisker.logging import HtmlColorHandler
 
@@ -119,6 +124,28 @@ class StyledQGroupBox(QGroupBox):
         self.setStyleSheet(GROUPBOX_STYLESHEET)
 
 
+# =============================================================================
+# Batched appending to a log widget
+# =============================================================================
+
+def append_batch(widget: QPlainTextEdit, pending: deque,
+                 html: bool = True) -> None:
+    """
+    Moves all messages from pending (a deque, which may be being appended to
+    by other threads) to the end of the widget, with a single repaint.
+    Old blocks are trimmed by the widget's maximumBlockCount.
+    """
+    if not pending:
+        return
+    append = widget.appendHtml if html else widget.appendPlainText
+    widget.setUpdatesEnabled(False)
+    try:
+        for _ in range(len(pending)):  # not "while": others may be adding
+            append(pending.popleft())
+    finally:
+        widget.setUpdatesEnabled(True)
+
+
 # =============================================================================
 # Hard-to-close dialog-style box for a GUI Python log window
 # =============================================================================
@@ -143,7 +170,8 @@ class LogWindow(QMainWindow):
                  logger: logging.Logger = None,
                  min_width: int = 800,
                  min_height: int = 400,
-                 maximum_block_count: int = 1000) -> None:
+                 maximum_block_count: int = 1000,
+                 flush_interval_ms: int = 40) -> None:
         super().__init__()
         self.setStyleSheet(LOGEDIT_STYLESHEET)
 
@@ -183,7 +211,18 @@ class LogWindow(QMainWindow):
         main_layout = QVBoxLayout(main_widget)
         main_layout.addWidget(log_group)
 
-        self.emit_msg.connect(self.log_internal)
+        self.emit_msg.connect(self.log_message)
+
+        # Messages arrive from any thread; they are queued here (deque.append
+        # is thread-safe) and added to the widget in batches by a GUI-thread
+        # timer, rather than causing a re-layout each. Anything beyond
+        # maximum_block_count would be trimmed anyway, so the queue is
+        # bounded likewise (0 or less meaning no limit, as for Qt).
+        self.pending = deque(
+            maxlen=maximum_block_count if maximum_block_count > 0 else None)
+        self.flush_timer = QTimer(self)
+        self.flush_timer.timeout.connect(self.flush)
+        self.flush_timer.start(flush_interval_ms)
 
         if logger:
             logger.addHandler(self.get_handler())
@@ -229,18 +268,15 @@ class LogWindow(QMainWindow):
             # log.debug("LogWindow: accept closeEvent")
             event.accept()
 
+    @pyqtSlot(str)
     def log_message(self, html: str) -> None:
-        # Jump threads via a signal
-        self.emit_msg.emit(html)
+        # Called from any thread (directly, or via emit_msg); flush() picks
+        # it up in the GUI thread.
+        self.pending.append(html)
 
-    @pyqtSlot(str)
-    def log_internal(self, html: str) -> None:
-        # self.log.moveCursor(QTextCursor.End)
-        # self.log.insertHtml(html)
-        self.log.appendHtml(html)
-        # self.scroll_to_end_of_log()
-        # ... unnecessary; if you're at the end, it scrolls, and if you're at
-        # the top, it doesn't bug you.
+    @pyqtSlot()
+    def flush(self) -> None:
+        append_batch(self.log, self.pending, html=True)
 
     @pyqtSlot()
     def exit(self) -> None:
@@ -265,7 +301,8 @@ class TextLogElement(object):
                  maximum_block_count: int = 1000,
                  font_size_pt: int = 10,
                  font_family: str = "Courier",
-                 title: str = "Log") -> None:
+                 title: str = "Log",
+                 flush_interval_ms: int = 40) -> None:
         # For nested layouts: (1) create everything, (2) lay out
         self.log_group = StyledQGroupBox(title)
         log_layout_1 = QVBoxLayout()
@@ -290,16 +327,27 @@ class TextLogElement(object):
         log_layout_1.addLayout(log_layout_2)
         self.log_group.setLayout(log_layout_1)
 
+        # As for LogWindow: batch additions, bounded by the block count.
+        self.pending = deque(
+            maxlen=maximum_block_count if maximum_block_count > 0 else None)
+        self.flush_timer = QTimer(self.log_group)
+        self.flush_timer.timeout.connect(self.flush)
+        self.flush_timer.start(flush_interval_ms)
+
     def get_widget(self) -> QWidget:
         return self.log_group
 
     def add(self, msg: str) -> None:
         # http://stackoverflow.com/questions/16568451
         # self.log.moveCursor(QTextCursor.End)
-        self.log.appendPlainText(msg)
-        # ... will append it as a *paragraph*, i.e. no need to add a newline
+        self.pending.append(msg)
+        # ... flush() uses appendPlainText(), which will append it as a
+        # *paragraph*, i.e. no need to add a newline
         # self.scroll_to_end_of_log()
 
+    def flush(self) -> None:
+        append_batch(self.log, self.pending, html=False)
+
     def copy_whole_log(self) -> None:
         # Ctrl-C will copy the selected parts.
         # log.copy() will copy the selected parts.
@@ -408,7 +456,7 @@ class TransactionalEditDialogMixin(object):
     """
     ok = pyqtSignal()
 
-    def __init__(self, session: Session, obj: object, layout: QLayout,
+    def __init__(self, session: 'Session', obj: object, layout: QLayout,
                  readonly: bool = False, **kwargs) -> None:
         super().__init__(**kwargs)
 
@@ -567,7 +615,7 @@ class TransactionalDialog(QDialog):
     The read-only situation REQUIRES that the session itself is read-only.
     """
 
-    def __init__(self, session: Session, readonly: bool = False,
+    def __init__(self, session: 'Session', readonly: bool = False,
                  parent: QObject = None, **kwargs) -> None:
         super().__init__(parent=parent, **kwargs)
         self.session = session
@@ -597,7 +645,7 @@ class TransactionalDialog(QDialog):
 # =============================================================================
 
 class DatabaseModelMixin(object):
-    def __init__(self, session: Session, listdata, **kwargs) -> None:
+    def __init__(self, session: 'Session', listdata, **kwargs) -> None:
         super().__init__(**kwargs)
         self.session = session
         self.listdata = listdata
@@ -609,6 +657,13 @@ class DatabaseModelMixin(object):
             return None
         return self.listdata[index]
 
+    def invalidate_row(self, row_index: int) -> None:
+        """Call when an object has been edited, to redisplay its row."""
+        if row_index is None or not (0 <= row_index < len(self.listdata)):
+            return
+        self.dataChanged.emit(self.index(row_index, 0),
+                              self.index(row_index, 0))
+
     # noinspection PyMethodMayBeStatic,PyUnusedLocal
     def item_deletable(self, rowindex: int) -> bool:
         """Override this if you need to prevent rows being deleted."""
@@ -637,7 +692,8 @@ class DatabaseModelMixin(object):
             if flush:
                 self.session.flush()
         # http://stackoverflow.com/questions/4702972
-        self.beginInsertRows(QModelIndex(), 0, 0)
+        # Announce just the new row, so the view doesn't redo the others.
+        self.beginInsertRows(QModelIndex(), index, index)
         self.listdata.insert(index, obj)
         self.endInsertRows()
 
@@ -646,18 +702,32 @@ class DatabaseModelMixin(object):
             raise ValueError("Bad index")
         if index == 0:
             return
-        x = self.listdata  # shorter name!
-        x[index - 1], x[index] = x[index], x[index - 1]
-        self.dataChanged.emit(QModelIndex(), QModelIndex())
+        self._move_row(index, index - 1)
 
     def move_down(self, index: int) -> None:
         if index is None or index < 0 or index >= len(self.listdata):
             raise ValueError("Bad index")
         if index == len(self.listdata) - 1:
             return
+        self._move_row(index, index + 1)
+
+    def _move_row(self, from_index: int, to_index: int) -> None:
+        """
+        Moves one row, telling views about that row only. Persistent indexes
+        (and therefore selections) follow the moved object.
+        """
+        # Qt's destinationChild is the row *before which* the moved row
+        # goes, in terms of the rows before the move; so moving down by one
+        # means "before the row after next".
+        # http://doc.qt.io/qt-5/qabstractitemmodel.html#beginMoveRows
+        dest = to_index + 1 if to_index > from_index else to_index
+        if not self.beginMoveRows(QModelIndex(), from_index, from_index,
+                                  QModelIndex(), dest):
+            raise ValueError("Bad move: {} -> {}".format(from_index,
+                                                         to_index))
         x = self.listdata  # shorter name!
-        x[index + 1], x[index] = x[index], x[index + 1]
-        self.dataChanged.emit(QModelIndex(), QModelIndex())
+        x.insert(to_index, x.pop(from_index))
+        self.endMoveRows()
 
 
 class ViewAssistMixin(object):
@@ -670,7 +740,7 @@ class ViewAssistMixin(object):
     # Initialization and setting data (model)
     # -------------------------------------------------------------------------
 
-    def __init__(self, session: Session,
+    def __init__(self, session: 'Session',
                  modal_dialog_class,
                  readonly: bool = False,
                  **kwargs) -> None:
@@ -849,6 +919,7 @@ class ViewAssistMixin(object):
         item = model.listdata[index.row()]
         win = self.modal_dialog_class(self.session, item, readonly=readonly)
         win.edit_in_nested_transaction()
+        model.invalidate_row(index.row())
 
     def edit_selected(self, readonly: bool = None) -> None:
         selected_modelindex = self.get_selected_modelindex()
@@ -891,7 +962,7 @@ class GenericListModel(QAbstractListModel, DatabaseModelMixin):
     Takes a list and provides a view on it using str().
     Note that it MODIFIES THE LIST PASSED TO IT.
     """
-    def __init__(self, data, session: Session, parent: QObject = None,
+    def __init__(self, data, session: 'Session', parent: QObject = None,
                  **kwargs) -> None:
         super().__init__(session=session, listdata=data, parent=parent,
                          **kwargs)
@@ -916,7 +987,7 @@ class ModalEditListView(QListView, ViewAssistMixin):
     # Initialization and setting data (model)
     # -------------------------------------------------------------------------
 
-    def __init__(self, session: Session, modal_dialog_class,
+    def __init__(self, session: 'Session', modal_dialog_class,
                  *args, **kwargs) -> None:
         self.readonly = kwargs.pop('readonly', False)
         super().__init__(session=session,
@@ -960,14 +1031,20 @@ class GenericAttrTableModel(QAbstractTableModel, DatabaseModelMixin):
             is via its lessThan() function.
 
     The tricky part is keeping selections persistent after sorting.
-    Not achieved yet. Simpler to wipe the selections.
+    sort() updates the model's persistent indexes, but GenericAttrTableView
+    still wipes the selection when you sort.
+
+    Display strings are computed on demand (i.e. only for cells the view
+    actually paints) and cached by row. The cache follows the model's own
+    row changes (insert/delete/move/sort/reset); if you change listdata or
+    its objects some other way, call invalidate_row() or invalidate_all().
     """
     # http://doc.qt.io/qt-4.8/qabstracttablemodel.html
 
     def __init__(self,
                  data,
                  header: List[Tuple[str, str]],
-                 session: Session,
+                 session: 'Session',
                  default_sort_column_name: str = None,
                  default_sort_order=Qt.AscendingOrder,
                  deletable: bool = True,
@@ -982,6 +1059,12 @@ class GenericAttrTableModel(QAbstractTableModel, DatabaseModelMixin):
                          **kwargs)
         self.header_display = [x[0] for x in header]
         self.header_attr = [x[1] for x in header]
+        self._display_cache = {}  # row: list of str (or None), per column
+        self.rowsInserted.connect(self._display_cache_rows_inserted)
+        self.rowsRemoved.connect(self._display_cache_rows_removed)
+        self.rowsMoved.connect(self.clear_display_cache)
+        self.layoutChanged.connect(self.clear_display_cache)
+        self.modelReset.connect(self.clear_display_cache)
         self.deletable = deletable
         self.default_sort_column_num = None
         self.default_sort_order = default_sort_order
@@ -1010,15 +1093,65 @@ class GenericAttrTableModel(QAbstractTableModel, DatabaseModelMixin):
              role: int = Qt.DisplayRole) -> Optional[str]:
         """Qt override."""
         if index.isValid() and role == Qt.DisplayRole:
-            obj = self.listdata[index.row()]
-            colname = self.header_attr[index.column()]
-            thing = getattr(obj, colname)
-            if callable(thing):
-                return str(thing())
-            else:
-                return str(thing)
+            return self.get_display_value(index.row(), index.column())
         return None
 
+    def get_value(self, obj: object, col: int) -> Any:
+        """Returns the attribute, or the result of calling the method."""
+        thing = getattr(obj, self.header_attr[col])
+        if callable(thing):
+            return thing()
+        return thing
+
+    def get_display_value(self, row: int, col: int) -> str:
+        cached = self._display_cache.get(row)
+        if cached is None:
+            cached = [None] * len(self.header_attr)
+            self._display_cache[row] = cached
+        text = cached[col]
+        if text is None:
+            text = str(self.get_value(self.listdata[row], col))
+            cached[col] = text
+        return text
+
+    def clear_display_cache(self, *args) -> None:
+        self._display_cache.clear()
+
+    # noinspection PyUnusedLocal
+    def _display_cache_rows_inserted(self, parent: QModelIndex,
+                                     first: int, last: int) -> None:
+        n = last - first + 1
+        self._display_cache = {
+            (row if row < first else row + n): texts
+            for row, texts in self._display_cache.items()
+        }
+
+    # noinspection PyUnusedLocal
+    def _display_cache_rows_removed(self, parent: QModelIndex,
+                                    first: int, last: int) -> None:
+        n = last - first + 1
+        self._display_cache = {
+            (row if row < first else row - n): texts
+            for row, texts in self._display_cache.items()
+            if not first <= row <= last
+        }
+
+    def invalidate_row(self, row_index: int) -> None:
+        """Call when an object has been edited, to redisplay its row."""
+        if self.get_object(row_index) is None:
+            return
+        self._display_cache.pop(row_index, None)
+        self.dataChanged.emit(self.index(row_index, 0),
+                              self.index(row_index, self.columnCount() - 1))
+
+    def invalidate_all(self) -> None:
+        """Call when objects have changed, to redisplay everything."""
+        self._display_cache.clear()
+        if self.listdata:
+            self.dataChanged.emit(
+                self.index(0, 0),
+                self.index(len(self.listdata) - 1, self.columnCount() - 1))
+
     # noinspection PyPep8Naming
     def headerData(self, col: int, orientation: int,
                    role: int = Qt.DisplayRole) -> Optional[str]:
@@ -1032,17 +1165,26 @@ class GenericAttrTableModel(QAbstractTableModel, DatabaseModelMixin):
         if not self.listdata:
             return
         self.layoutAboutToBeChanged.emit()
-        colname = self.header_attr[col]
-        isfunc = callable(getattr(self.listdata[0], colname))
-        if isfunc:
-            self.listdata = sorted(
-                self.listdata,
-                key=methodcaller_nonesort(colname))
-        else:
-            self.listdata = sorted(self.listdata,
-                                   key=attrgetter_nonesort(colname))
+        # Decorate-sort-undecorate: fetch each value once, rather than once
+        # per comparison. As with attrgetter_nonesort/methodcaller_nonesort,
+        # None sorts before everything else.
+        values = [self.get_value(obj, col) for obj in self.listdata]
+        keys = [(0, ) if v is None else (1, v) for v in values]
+        new_to_old = sorted(range(len(keys)), key=keys.__getitem__)
         if order == Qt.DescendingOrder:
-            self.listdata.reverse()
+            new_to_old.reverse()
+        self.listdata[:] = [self.listdata[i] for i in new_to_old]
+        # Keep persistent indexes (e.g. selections) pointing to the same
+        # objects.
+        persistent = self.persistentIndexList()
+        if persistent:
+            old_to_new = [0] * len(new_to_old)
+            for new_row, old_row in enumerate(new_to_old):
+                old_to_new[old_row] = new_row
+            self.changePersistentIndexList(
+                persistent,
+                [self.index(old_to_new[pi.row()], pi.column())
+                 for pi in persistent])
         self.layoutChanged.emit()
 
 
@@ -1054,7 +1196,7 @@ class GenericAttrTableView(QTableView, ViewAssistMixin):
     # -------------------------------------------------------------------------
 
     def __init__(self,
-                 session: Session,
+                 session: 'Session',
                  modal_dialog_class,
                  parent: QObject = None,
                  sortable: bool = True,
@@ -1096,13 +1238,21 @@ class GenericAttrTableView(QTableView, ViewAssistMixin):
         self.resize()
 
     def resize(self) -> None:
-        # Resize all rows to have the correct height
-        if self.sizing_done:
+        # Rows keep the default height: resizeRowsToContents() would work out
+        # the display text of every cell in every row. Columns are sized to
+        # the rows in view only (precision 0), so that waits until the view
+        # is shown; before then, Qt would look at every row.
+        if self.sizing_done or not self.isVisible():
             return
-        self.resizeRowsToContents()
+        self.horizontalHeader().setResizeContentsPrecision(0)
         self.resizeColumnsToContents()
         self.sizing_done = True
 
+    # noinspection PyPep8Naming
+    def showEvent(self, event) -> None:
+        super().showEvent(event)
+        self.resize()
+
     # -------------------------------------------------------------------------
     # Selection
     # -------------------------------------------------------------------------
@@ -1122,6 +1272,242 @@ class GenericAttrTableView(QTableView, ViewAssistMixin):
         return selected_indexes[0]
 
 
+# =============================================================================
+# Models that fetch their objects from a database query, a page at a time
+# =============================================================================
+
+def keyset_criterion(columns: List['ColumnElement'],
+                     values: List[Any],
+                     descending: bool = False) -> 'ColumnElement':
+    """
+    Returns an SQL condition meaning "rows after these values", in the order
+    given by the columns, i.e. (for two columns, ascending)
+        (a > va) OR (a = va AND b > vb)
+    This is the row-value comparison (a, b) > (va, vb), written out because
+    not all databases support that.
+    """
+    from sqlalchemy import and_, or_
+    clauses = []
+    for i, (col, val) in enumerate(zip(columns, values)):
+        beyond = col < val if descending else col > val
+        equal_so_far = [c == v for c, v in zip(columns[:i], values[:i])]
+        clauses.append(and_(*(equal_so_far + [beyond])))
+    return or_(*clauses)
+
+
+class PagedQueryMixin(object):
+    """
+    Mixin for GenericListModel/GenericAttrTableModel, whose objects come from
+    an SQLAlchemy ORM Query, fetched a page at a time as the view needs them
+    (via Qt's canFetchMore/fetchMore), rather than from a fully materialized
+    list.
+
+    Pages are fetched by "keyset":
+        ... WHERE (sortcol, pk) > (values from last row)
+            ORDER BY sortcol, pk LIMIT page_size
+    which stays fast however far down the list you are, unlike OFFSET.
+    Keyset paging is used for primary key order, and for sort columns
+    declared NOT NULL (nullable=False). Any other sort column (i.e. most
+    plain Column()s) is paged with OFFSET instead, since databases disagree
+    about where NULLs sort.
+
+    Rows added or deleted via the model (insert_at_index(), delete_item(),
+    and so the views' add/remove functions) are allowed for: an object
+    already in the list is never added again by a later page, and
+    deletions from the session move the OFFSET back.
+
+    Any ORDER BY on the query you supply is replaced; by default, objects
+    are in primary key order.
+    """
+
+    def __init__(self, query: 'Query', page_size: int = 200,
+                 **kwargs) -> None:
+        from sqlalchemy.orm import class_mapper
+        self.query = query
+        self.page_size = page_size
+        self._paged_entity = query.column_descriptions[0]['entity']
+        mapper = class_mapper(self._paged_entity)
+        self._paged_pk_columns = list(mapper.primary_key)
+        self._paged_pk_attrs = [mapper.get_property_by_column(c).key
+                                for c in self._paged_pk_columns]
+        self._paged_sort_column = None  # type: Optional['ColumnElement']
+        self._paged_sort_attr = None  # type: Optional[str]
+        self._paged_descending = False
+        self._paged_use_offset = False
+        self._paged_started = False
+        self._paged_exhausted = False
+        self._paged_n_fetched = 0
+        self._paged_last_values = None  # type: Optional[List[Any]]
+        # Objects ever listed, by id(), so pages don't add them again.
+        self._paged_seen = {}  # type: Dict[int, object]
+        super().__init__(data=[], session=query.session, **kwargs)
+        if not self._paged_started:  # sort() might have started us already
+            self.fetchMore()
+
+    def _paged_order_columns(self) -> List['ColumnElement']:
+        if self._paged_sort_column is None:
+            return self._paged_pk_columns
+        return [self._paged_sort_column] + self._paged_pk_columns
+
+    def _paged_order_attrs(self) -> List[str]:
+        if self._paged_sort_attr is None:
+            return self._paged_pk_attrs
+        return [self._paged_sort_attr] + self._paged_pk_attrs
+
+    def get_page_query(self) -> 'Query':
+        """Returns the query for the next page."""
+        from sqlalchemy import desc
+        columns = self._paged_order_columns()
+        q = self.query.order_by(None)
+        if (self._paged_last_values is not None and
+                not self._paged_use_offset):
+            q = q.filter(keyset_criterion(columns, self._paged_last_values,
+                                          self._paged_descending))
+        if self._paged_descending:
+            q = q.order_by(*[desc(c) for c in columns])
+        else:
+            q = q.order_by(*columns)
+        if self._paged_use_offset:
+            q = q.offset(self._paged_n_fetched)
+        return q.limit(self.page_size)
+
+    # noinspection PyUnusedLocal,PyPep8Naming
+    def canFetchMore(self, parent: QModelIndex = QModelIndex()) -> bool:
+        """Qt override."""
+        return not parent.isValid() and not self._paged_exhausted
+
+    # noinspection PyUnusedLocal,PyPep8Naming
+    def fetchMore(self, parent: QModelIndex = QModelIndex()) -> None:
+        """Qt override."""
+        self._paged_started = True
+        if self._paged_exhausted:
+            return
+        page = self.get_page_query().all()
+        if len(page) < self.page_size:
+            self._paged_exhausted = True
+        if not page:
+            return
+        self._paged_n_fetched += len(page)
+        last = page[-1]
+        self._paged_last_values = [getattr(last, a)
+                                   for a in self._paged_order_attrs()]
+        # A page can include objects we already have: ones inserted via the
+        # model, or (with OFFSET) ones that moved back after a deletion.
+        objects = [obj for obj in page if id(obj) not in self._paged_seen]
+        if not objects:
+            return
+        for obj in objects:
+            self._paged_seen[id(obj)] = obj
+        first_row = len(self.listdata)
+        self.beginInsertRows(QModelIndex(), first_row,
+                             first_row + len(objects) - 1)
+        self.listdata.extend(objects)
+        self.endInsertRows()
+
+    def fetch_all(self) -> None:
+        while self.canFetchMore():
+            self.fetchMore()
+
+    def insert_at_index(self, obj: object, index: int = None,
+                        add_to_session: bool = True,
+                        flush: bool = True) -> None:
+        super().insert_at_index(obj, index,
+                                add_to_session=add_to_session, flush=flush)
+        self._paged_seen[id(obj)] = obj
+
+    def delete_item(self, row_index: int,
+                    delete_from_session: bool = True) -> None:
+        super().delete_item(row_index,
+                            delete_from_session=delete_from_session)
+        if delete_from_session and self._paged_n_fetched > 0:
+            # One row fewer before the OFFSET. (If the row wasn't one we'd
+            # fetched, the next page just repeats a row, which is skipped.)
+            self._paged_n_fetched -= 1
+
+    def set_query_order(self, attrname: Optional[str],
+                        descending: bool = False) -> bool:
+        """
+        Restarts paging, in the order of the named attribute (then the
+        primary key). Returns False, and does nothing, if the attribute isn't
+        a plain column, so the database can't sort by it.
+        """
+        from sqlalchemy.orm import ColumnProperty
+        column = None
+        use_offset = False
+        if attrname is not None:
+            prop = getattr(getattr(self._paged_entity, attrname, None),
+                           'property', None)
+            if not isinstance(prop, ColumnProperty):
+                return False
+            column = prop.columns[0]
+            use_offset = getattr(column, 'nullable', True)
+        self.beginResetModel()
+        self._paged_sort_column = column
+        self._paged_sort_attr = attrname
+        self._paged_descending = descending
+        self._paged_use_offset = use_offset
+        self.clear_paged_caches()
+        self.endResetModel()
+        self.fetchMore()
+        return True
+
+    def clear_paged_caches(self) -> None:
+        """
+        Discards the rows fetched so far and the paging position, so the
+        next fetchMore() starts again at the first page. Call between
+        beginResetModel() and endResetModel().
+        """
+        self._paged_exhausted = False
+        self._paged_n_fetched = 0
+        self._paged_last_values = None
+        self._paged_seen.clear()
+        self.listdata.clear()
+
+
+class PagedQueryListModel(PagedQueryMixin, GenericListModel):
+    """
+    GenericListModel whose objects come from an ORM query, a page at a time.
+    """
+    def __init__(self, query: 'Query', page_size: int = 200,
+                 parent: QObject = None, **kwargs) -> None:
+        super().__init__(query=query, page_size=page_size, parent=parent,
+                         **kwargs)
+
+
+class PagedQueryAttrTableModel(PagedQueryMixin, GenericAttrTableModel):
+    """
+    GenericAttrTableModel whose objects come from an ORM query, a page at a
+    time. Sorting by a plain column is done by the database (ORDER BY);
+    sorting by anything else (e.g. a method) fetches all rows and sorts them
+    in Python.
+    """
+    def __init__(self,
+                 query: 'Query',
+                 header: List[Tuple[str, str]],
+                 page_size: int = 200,
+                 default_sort_column_name: str = None,
+                 default_sort_order=Qt.AscendingOrder,
+                 deletable: bool = True,
+                 parent: QObject = None,
+                 **kwargs) -> None:
+        super().__init__(query=query,
+                         page_size=page_size,
+                         header=header,
+                         default_sort_column_name=default_sort_column_name,
+                         default_sort_order=default_sort_order,
+                         deletable=deletable,
+                         parent=parent,
+                         **kwargs)
+
+    def sort(self, col: int, order: int = Qt.AscendingOrder) -> None:
+        """Sort table by column number col."""
+        if self.set_query_order(self.header_attr[col],
+                                descending=(order == Qt.DescendingOrder)):
+            return
+        self.fetch_all()
+        super().sort(col, order)
+
+
 # =============================================================================
 # Framework for radio buttons
 # =============================================================================
@@ -74,6 +74,7 @@ from whisker.constants import DEFAULT_PORT
 # from whisker.debug_qt import debug_object, debug_thread
 from whisker.lang import CompiledRegexMemory
 from whisker.qt import exit_on_exception, StatusMixin
+from whisker.wiretrace import DEFAULT_WIRETRACE_LENGTH, WireTrace
 
 log = logging.getLogger(__name__)
 
@@ -146,10 +147,13 @@ class WhiskerOwner(QObject, StatusMixin):  # GUI thread
                  read_timeout_ms: int = 500,
                  name: str = "whisker_owner",
                  sysevent_prefix: str = 'sys_',
+                 wiretrace_length: int = DEFAULT_WIRETRACE_LENGTH,
                  **kwargs) -> None:
         super().__init__(parent=parent, name=name, logger=log, **kwargs)
         self.state = ThreadOwnerState.stopped
         self.is_connected = False
+        # One trace, shared by the main socket and immediate socket threads:
+        self.wiretrace = WireTrace(maxlen=wiretrace_length, logger=log)
 
         self.mainsockthread = QThread(self)
         self.mainsock = WhiskerMainSocketListener(
@@ -157,12 +161,14 @@ class WhiskerOwner(QObject, StatusMixin):  # GUI thread
             main_port,
             connect_timeout_ms=connect_timeout_ms,
             read_timeout_ms=read_timeout_ms,
+            wiretrace=self.wiretrace,
             parent=None)  # must be None as it'll go to a different thread
         self.mainsock.moveToThread(self.mainsockthread)
 
         self.taskthread = QThread(self)
         self.controller = WhiskerController(server,
-                                            sysevent_prefix=sysevent_prefix)
+                                            sysevent_prefix=sysevent_prefix,
+                                            wiretrace=self.wiretrace)
         self.controller.moveToThread(self.taskthread)
         self.task = task
         # debug_object(self)
@@ -259,6 +265,7 @@ class WhiskerOwner(QObject, StatusMixin):  # GUI thread
         self.disconnected.emit()
         if self.state == ThreadOwnerState.stopping:
             return
+        self.dump_wire_trace("disconnected")
         self.stop()
 
     def stop(self) -> None:
@@ -306,6 +313,12 @@ class WhiskerOwner(QObject, StatusMixin):  # GUI thread
             return
         self.ping_requested.emit()
 
+    def dump_wire_trace(self, reason: str = "") -> None:
+        """
+        Writes the lines to/from the server since the last dump to the log.
+        """
+        self.wiretrace.dump(reason)
+
 
 # =============================================================================
 # Main socket listener
@@ -323,12 +336,14 @@ class WhiskerMainSocketListener(QObject, StatusMixin):  # Whisker thread A
                  connect_timeout_ms: int = 5000,
                  read_timeout_ms: int = 100,
                  name: str = "whisker_mainsocket",
+                 wiretrace: WireTrace = None,
                  **kwargs) -> None:
         super().__init__(parent=parent, name=name, logger=log, **kwargs)
         self.server = server
         self.port = port
         self.connect_timeout_ms = connect_timeout_ms
         self.read_timeout_ms = read_timeout_ms
+        self.wiretrace = wiretrace or WireTrace(logger=log)
 
         self.finish_requested = False
         self.residual = ''
@@ -385,7 +400,7 @@ class WhiskerMainSocketListener(QObject, StatusMixin):  # Whisker thread A
         if not is_socket_connected(self.socket):
             self.error("Can't send through a closed socket")
             return
-        self.debug("Sending to server (MAIN): {}".format(msg))
+        self.wiretrace.record_sent(msg)
         final_str = msg + EOL
         data_bytes = final_str.encode(ENCODING)
         self.socket.write(data_bytes)
@@ -401,14 +416,13 @@ class WhiskerMainSocketListener(QObject, StatusMixin):  # Whisker thread A
         Adds the incoming data to any stored residual, splits it into lines,
         and sends each line on to the receiver.
         """
-        self.debug("incoming: {}".format(repr(data)))
         timestamp = arrow.now()
         data = self.residual + data
         fragments = data.split(EOL)
         lines = fragments[:-1]
         self.residual = fragments[-1]
         for line in lines:
-            self.debug("incoming line: {}".format(line))
+            self.wiretrace.record_received(line)
             if line == PING:
                 self.sendline_mainsock(PING_ACK)
                 self.status("Ping received from server")
@@ -438,6 +452,7 @@ class WhiskerController(QObject, StatusMixin, WhiskerApi):  # Whisker thread B
                  read_timeout_ms: int = 500,
                  name: str = "whisker_controller",
                  sysevent_prefix: str = "sys_",
+                 wiretrace: WireTrace = None,
                  **kwargs) -> None:
         super().__init__(
             # QObject
@@ -459,6 +474,7 @@ class WhiskerController(QObject, StatusMixin, WhiskerApi):  # Whisker thread B
         self.code = None
         self.immsocket = None
         self.residual = ''
+        self.wiretrace = wiretrace or WireTrace(logger=log)
 
     @pyqtSlot(str, arrow.Arrow)
     @exit_on_exception
@@ -508,8 +524,10 @@ class WhiskerController(QObject, StatusMixin, WhiskerApi):  # Whisker thread B
         elif WARNING_REGEX.match(msg):
             self.warning_received.emit(msg, timestamp, whisker_timestamp)
         elif SYNTAX_ERROR_REGEX.match(msg):
+            self.wiretrace.dump("syntax error from server")
             self.syntax_error_received.emit(msg, timestamp, whisker_timestamp)
         elif ERROR_REGEX.match(msg):
+            self.wiretrace.dump("error from server")
             self.error_received.emit(msg, timestamp, whisker_timestamp)
         elif msg == PING_ACK:
             self.pingack_received.emit(timestamp, whisker_timestamp)
@@ -523,7 +541,7 @@ class WhiskerController(QObject, StatusMixin, WhiskerApi):  # Whisker thread B
 
     def sendline_immsock(self, *args) -> None:
         msg = msg_from_args(*args)
-        self.debug("Sending to server (IMM): {}".format(msg))
+        self.wiretrace.record_sent(msg, "imm")
         final_str = msg + EOL
         data_bytes = final_str.encode(ENCODING)
         self.immsocket.write(data_bytes)
@@ -547,7 +565,7 @@ class WhiskerController(QObject, StatusMixin, WhiskerApi):  # Whisker thread B
         eol_index = data.index(EOL)
         line = data[:eol_index]
         self.residual = data[eol_index + EOL_LEN:]
-        self.debug("Reply from server (IMM): {}".format(line))
+        self.wiretrace.record_received(line, "imm")
         return line
 
     def get_immsock_response(self, *args) -> Optional[str]:
@@ -1,11 +1,47 @@
 #!/usr/bin/env python
 # whisker/random.py
 
+from collections import OrderedDict
+import hashlib
+from itertools import chain
+import json
 import operator
 import random
-from typing import Any, List
+from typing import Any, Callable, Dict, Iterable, List, Optional
 
-from whisker.lang import flatten_list, sort_list_by_index_list
+from whisker.lang import apply_permutation
+
+
+# =============================================================================
+# Random number streams
+# =============================================================================
+
+def derive_seed(master_seed: Any, *keys: Any) -> int:
+    """
+    Returns a seed derived from a master seed and any number of keys (e.g.
+    box, subject, session): the SHA-256 of them, as JSON. The same inputs
+    give the same seed in any process, on any machine; different inputs give
+    unrelated seeds.
+    """
+    data = json.dumps([master_seed] + list(keys), sort_keys=True,
+                      separators=(',', ':'), default=str)
+    return int.from_bytes(hashlib.sha256(data.encode('utf-8')).digest(),
+                          'big')
+
+
+def derive_rng(master_seed: Any, *keys: Any) -> random.Random:
+    """
+    Returns an independent random number generator for the keys, e.g.
+
+        rng = derive_rng(master_seed, box, subject, session)
+        block_shuffle_by_attr(trials, ['block', 'stimulus'], rng=rng)
+
+    All the shuffling functions here take an rng argument; without one,
+    they use the random module's global generator. Each box (or worker
+    process) can have its own stream, so output doesn't depend on what
+    else is using random numbers, or in what order.
+    """
+    return random.Random(derive_seed(master_seed, *keys))
 
 
 # =============================================================================
@@ -13,15 +49,17 @@ from whisker.lang import flatten_list, sort_list_by_index_list
 # =============================================================================
 
 def shuffle_list_slice(x: List[Any],
-                       start: int = None, end: int = None) -> None:
+                       start: int = None, end: int = None,
+                       rng: random.Random = None) -> None:
     """Shuffles a segment of a list (in place)."""
     # log.debug("x={}, start={}, end={}".format(x, start, end))
     copy = x[start:end]
-    random.shuffle(copy)
+    (rng or random).shuffle(copy)
     x[start:end] = copy
 
 
-def shuffle_list_within_chunks(x: List[Any], chunksize: int) -> None:
+def shuffle_list_within_chunks(x: List[Any], chunksize: int,
+                               rng: random.Random = None) -> None:
     """
     Divides a list into chunks and shuffles WITHIN each chunk (in place).
     For example:
@@ -34,10 +72,11 @@ def shuffle_list_within_chunks(x: List[Any], chunksize: int) -> None:
     # noinspection PyTypeChecker
     ends = starts[1:] + [None]
     for start, end in zip(starts, ends):
-        shuffle_list_slice(x, start, end)
+        shuffle_list_slice(x, start, end, rng)
 
 
-def shuffle_list_chunks(x: List[Any], chunksize: int) -> None:
+def shuffle_list_chunks(x: List[Any], chunksize: int,
+                        rng: random.Random = None) -> None:
     """
     Divides a list into chunks and shuffles the chunks themselves (in place).
     For example:
@@ -46,22 +85,17 @@ def shuffle_list_chunks(x: List[Any], chunksize: int) -> None:
     x might now be [5, 6, 7, 8, 1, 2, 3, 4, 9, 10, 11, 12]
                     ^^^^^^^^^^  ^^^^^^^^^^  ^^^^^^^^^^^^^
     """
+    # Shuffle the chunk boundaries rather than the list, then write back.
     starts = list(range(0, len(x), chunksize))
-    ends = starts[1:] + [len(x)]
-    # Shuffle the indexes rather than the array, then we can write back
-    # in place.
-    chunks = []
-    for start, end in zip(starts, ends):
-        chunks.append(list(range(start, end)))
-    random.shuffle(chunks)
-    indexes = flatten_list(chunks)
-    sort_list_by_index_list(x, indexes)
+    (rng or random).shuffle(starts)
+    x[:] = list(chain.from_iterable(x[s:s + chunksize] for s in starts))
 
 
-def shuffle_list_subset(x: List[Any], indexes: List[int]) -> None:
+def shuffle_list_subset(x: List[Any], indexes: List[int],
+                        rng: random.Random = None) -> None:
     """Shuffles some elements of a list, specified by index."""
     elements = [x[i] for i in indexes]
-    random.shuffle(elements)
+    (rng or random).shuffle(elements)
     for element_idx, x_idx in enumerate(indexes):
         x[x_idx] = elements[element_idx]
 
@@ -71,10 +105,70 @@ def last_index_of(x: List[Any], value: Any) -> int:
     return len(x) - 1 - x[::-1].index(value)
 
 
+def group_indexes(x: List[Any],
+                  indexes: Iterable[int],
+                  keyfunc: Callable[[Any], Any]) -> List[List[int]]:
+    """
+    Groups the indexes into x by keyfunc(x[index]), in one pass. Groups come
+    in order of first appearance, and indexes keep their order within each
+    group. Unhashable keys (e.g. lists) are grouped by tuple(key).
+    """
+    groups = OrderedDict()  # type: Dict[Any, List[int]]
+    for i in indexes:
+        key = keyfunc(x[i])
+        try:
+            group = groups.get(key)
+        except TypeError:  # unhashable type: 'list'
+            key = tuple(key)
+            group = groups.get(key)
+        if group is None:
+            groups[key] = [i]
+        else:
+            group.append(i)
+    return list(groups.values())
+
+
+def block_shuffle_by_key(x: List[Any],
+                         keyfuncs: List[Callable[[Any], Any]],
+                         start: int = None,
+                         end: int = None,
+                         rng: random.Random = None) -> None:
+    """
+    Shuffles the list x (or the slice x[start:end]) hierarchically, in place.
+    keyfuncs is a list of functions giving the key of each item at each level;
+    the first varies slowest, the last fastest. At each level, blocks of
+    items with equal keys are put in a random order; items whose keys are
+    equal at every level keep their original relative order.
+    See block_shuffle_by_item() for an example.
+
+    Takes O(N) time per level: one grouping pass, then the items are
+    permuted in place.
+    """
+    rng = rng or random
+    lo, hi, _ = slice(start, end).indices(len(x))
+    order = []  # type: List[int]
+
+    def add_level(indexes: Iterable[int], level: int) -> None:
+        groups = group_indexes(x, indexes, keyfuncs[level])
+        rng.shuffle(groups)
+        if level + 1 < len(keyfuncs):
+            for group in groups:
+                add_level(group, level + 1)
+        else:
+            for group in groups:
+                order.extend(group)
+
+    if not keyfuncs or hi <= lo:
+        return
+    add_level(range(lo, hi), 0)
+    apply_permutation(x, order, lo)
+
+
 def block_shuffle_by_item(x: List[Any],
                           indexorder: List[int],
                           start: int = None,
-                          end: int = None) -> None:
+                          end: int = None,
+                          rng: random.Random = None) -> None:
     """
     Shuffles the list x hierarchically, in place.
     indexorder is a list of indexes of each item of x.
@@ -106,40 +200,15 @@ def block_shuffle_by_item(x: List[Any],
         ...                                 } ...
 
     """
-    item_idx_order = indexorder.copy()
-    item_idx = item_idx_order.pop(0)
-
-    # 1. Take copy
-    sublist = x[start:end]
-
-    # 2. Sort then shuffle in chunks (e.g. at the "ABC" level)
-    sublist.sort(key=operator.itemgetter(item_idx))
-    # Note below that we must convert things to tuples to put them into
-    # sets; if you take a set() of lists, you get
-    #   TypeError: unhashable type: 'list'
-    unique_values = set(tuple(x[item_idx]) for x in sublist)
-    chunks = [
-        [i for i, v in enumerate(sublist) if tuple(v[item_idx]) == value]
-        for value in unique_values
-    ]
-    random.shuffle(chunks)
-    indexes = flatten_list(chunks)
-    sort_list_by_index_list(sublist, indexes)
-
-    # 3. Call recursively (e.g. at the "xyz" level next)
-    if item_idx_order:  # more to do?
-        starts_ends = [(min(chunk), max(chunk) + 1) for chunk in chunks]
-        for s, e in starts_ends:
-            block_shuffle_by_item(sublist, item_idx_order, s, e)
-
-    # 4. Write back
-    x[start:end] = sublist
+    block_shuffle_by_key(x, [operator.itemgetter(i) for i in indexorder],
+                         start, end, rng)
 
 
 def block_shuffle_by_attr(x: List[Any],
                           attrorder: List[str],
                           start: int = None,
-                          end: int = None) -> None:
+                          end: int = None,
+                          rng: random.Random = None) -> None:
     """
     Exactly as for block_shuffle_by_item, but by item attribute
     rather than item index number.
@@ -150,33 +219,12 @@ def block_shuffle_by_attr(x: List[Any],
         q = [AttrDict({'one': x[0], 'two': x[1], 'three': x[2]}) for x in p]
         block_shuffle_by_attr(q, ['one', 'two', 'three'])
     """
-    item_attr_order = attrorder.copy()
-    item_attr = item_attr_order.pop(0)
-    # 1. Take copy
-    sublist = x[start:end]
-    # 2. Sort then shuffle in chunks
-    sublist.sort(key=operator.attrgetter(item_attr))
-    unique_values = set(tuple(getattr(x, item_attr)) for x in sublist)
-    chunks = [
-        [
-            i for i, v in enumerate(sublist)
-            if tuple(getattr(v, item_attr)) == value
-        ]
-        for value in unique_values
-    ]
-    random.shuffle(chunks)
-    indexes = flatten_list(chunks)
-    sort_list_by_index_list(sublist, indexes)
-    # 3. Call recursively (e.g. at the "xyz" level next)
-    if item_attr_order:  # more to do?
-        starts_ends = [(min(chunk), max(chunk) + 1) for chunk in chunks]
-        for s, e in starts_ends:
-            block_shuffle_by_attr(sublist, item_attr_order, s, e)
-    # 4. Write back
-    x[start:end] = sublist
+    block_shuffle_by_key(x, [operator.attrgetter(a) for a in attrorder],
+                         start, end, rng)
 
 
-def shuffle_where_equal_by_attr(x: List[Any], attrname: str) -> None:
+def shuffle_where_equal_by_attr(x: List[Any], attrname: str,
+                                rng: random.Random = None) -> None:
     """
     Shuffles a list x, in place, where list members are equal as judged by the
     attribute attrname.
@@ -187,10 +235,189 @@ def shuffle_where_equal_by_attr(x: List[Any], attrname: str) -> None:
         q = [AttrDict({'one': x[0], 'two': x[1], 'three': x[2]}) for x in p]
         shuffle_where_equal_by_attr(q, 'three')
     """
-    unique_values = set(tuple(getattr(item, attrname)) for item in x)
-    for value in unique_values:
-        indexes = [
-            i for i, item in enumerate(x)
-            if tuple(getattr(item, attrname)) == value
-        ]
-        shuffle_list_subset(x, indexes)
+    for indexes in group_indexes(x, range(len(x)),
+                                 operator.attrgetter(attrname)):
+        if len(indexes) > 1:
+            shuffle_list_subset(x, indexes, rng)
+
+
+# =============================================================================
+# Constrained sequences
+# =============================================================================
+
+def weighted_order(values: List[Any], weights: List[float],
+                   rng: random.Random = None) -> List[Any]:
+    """
+    Returns the values in a random order, where values with bigger weights
+    tend to come earlier: the order is that of drawing values one at a time,
+    without replacement, with probability proportional to weight.
+    """
+    rng = rng or random
+    keys = [rng.random() ** (1.0 / w) for w in weights]
+    return [v for _, v in sorted(zip(keys, values), key=operator.itemgetter(0),
+                                 reverse=True)]
+
+
+def run_length_feasible(counts: Dict[Any, int],
+                        last: Any,
+                        run: int,
+                        max_run_length: int) -> bool:
+    """
+    Can the remaining counts ({value: number left}) be arranged with no run
+    longer than max_run_length, given that the sequence so far ends with a
+    run of length run of the value last?
+
+    Each value's items must be split into runs separated by other items;
+    there are (others + 1) gaps for them, of which the first is already
+    partly used if that value is last.
+    """
+    total = sum(counts.values())
+    for value, n in counts.items():
+        if not n:
+            continue
+        others = total - n
+        if value == last:
+            capacity = (max_run_length - run) + max_run_length * others
+        else:
+            capacity = max_run_length * (others + 1)
+        if n > capacity:
+            return False
+    return True
+
+
+def constrained_sequence(counts: Dict[Any, int],
+                         max_run_length: int = None,
+                         rng: random.Random = None) -> List[Any]:
+    """
+    Returns a random order of a multiset of conditions, e.g.
+    {'left': 50, 'right': 50}, in which no condition occurs more than
+    max_run_length times in a row (so 1 means no immediate repeats).
+
+    The sequence is built one item at a time. Each step chooses randomly
+    (weighted by how many of each condition are left, as for drawing from a
+    shuffled deck) among conditions that still allow a valid arrangement of
+    what's left (see run_length_feasible), so there's no shuffle-and-retry;
+    it backtracks if it meets a dead end. Raises ValueError if the
+    constraints can't be met.
+    """
+    rng = rng or random
+    remaining = OrderedDict(
+        (k, v) for k, v in counts.items() if v > 0)  # type: Dict[Any, int]
+    if any(v < 0 for v in counts.values()):
+        raise ValueError("Negative count")
+    if max_run_length is not None and max_run_length < 1:
+        raise ValueError("max_run_length must be at least 1")
+    total = sum(remaining.values())
+    if max_run_length is None:
+        max_run_length = total
+    if not run_length_feasible(remaining, None, 0, max_run_length):
+        raise ValueError("No sequence with runs of at most {} exists for "
+                         "{}".format(max_run_length, dict(counts)))
+    sequence = []  # type: List[Any]
+    run = 0
+
+    def get_options() -> List[Any]:
+        last = sequence[-1] if sequence else None
+        candidates = []
+        weights = []
+        for value, n in remaining.items():
+            if not n:
+                continue
+            newrun = run + 1 if sequence and value == last else 1
+            if newrun > max_run_length:
+                continue
+            remaining[value] -= 1
+            if run_length_feasible(remaining, value, newrun, max_run_length):
+                candidates.append(value)
+                weights.append(n)
+            remaining[value] += 1
+        # Reversed, so we can pop() the first choice from the end.
+        return weighted_order(candidates, weights, rng)[::-1]
+
+    stack = [get_options()]
+    while len(sequence) < total:
+        options = stack[-1]
+        if not options:
+            # Dead end: undo the previous choice.
+            stack.pop()
+            if not sequence:
+                raise ValueError("No valid sequence")
+            remaining[sequence.pop()] += 1
+            run = 0
+            for value in reversed(sequence):
+                if value != sequence[-1]:
+                    break
+                run += 1
+            continue
+        value = options.pop()
+        run = run + 1 if sequence and value == sequence[-1] else 1
+        sequence.append(value)
+        remaining[value] -= 1
+        stack.append(get_options())
+    return sequence
+
+
+def balanced_transition_sequence(conditions: List[Any],
+                                 repeats: int = 1,
+                                 allow_repeats: bool = True,
+                                 rng: random.Random = None) -> List[Any]:
+    """
+    Returns a random sequence of conditions that is first-order
+    counterbalanced: every condition is followed by every condition (or,
+    if allow_repeats is False, every other condition) exactly repeats times.
+
+    With k conditions, there are k * k * repeats transitions
+    (k * (k - 1) * repeats without repeats), so the sequence is one item
+    longer than that; the first condition is also the last.
+
+    Such a sequence is an Eulerian circuit of the graph of transitions. It's
+    sampled uniformly (via the BEST theorem): pick a random start, a random
+    spanning tree of "last exits" towards it (Wilson's algorithm), and a
+    random order for each condition's other transitions.
+    """
+    rng = rng or random
+    k = len(conditions)
+    if k == 0 or repeats < 1:
+        return []
+    if not allow_repeats and k < 2:
+        raise ValueError("Need two conditions to avoid repeats")
+    # Transitions out of each condition, by index.
+    exits = [
+        [v for v in range(k) if allow_repeats or v != u] * repeats
+        for u in range(k)
+    ]
+    root = rng.randrange(k)
+
+    # Wilson's algorithm: loop-erased random walks towards the tree.
+    in_tree = [False] * k
+    in_tree[root] = True
+    last_exit = [None] * k  # type: List[Optional[int]]
+    starts = list(range(k))
+    rng.shuffle(starts)
+    for start in starts:
+        u = start
+        while not in_tree[u]:
+            last_exit[u] = rng.choice(exits[u])
+            u = last_exit[u]
+        u = start
+        while not in_tree[u]:
+            in_tree[u] = True
+            u = last_exit[u]
+
+    for u in range(k):
+        rng.shuffle(exits[u])
+        if u != root:
+            exits[u].remove(last_exit[u])
+            exits[u].append(last_exit[u])
+
+    # Follow the exits in order.
+    n_transitions = sum(len(e) for e in exits)
+    next_exit = [0] * k
+    u = root
+    indexes = [root]
+    for _ in range(n_transitions):
+        v = exits[u][next_exit[u]]
+        next_exit[u] += 1
+        indexes.append(v)
+        u = v
+    return [conditions[i] for i in indexes]
@@ -29,6 +29,7 @@ from whisker.socket import (
     socket_send,
     socket_sendall,
 )
+from whisker.wiretrace import DEFAULT_WIRETRACE_LENGTH, WireTrace
 
 log = logging.getLogger(__name__)
 
@@ -42,9 +43,11 @@ class Whisker(object):
     (Not sophisticated. Use WhiskerTask instead.)
     """
 
-    def __init__(self) -> None:
+    def __init__(self,
+                 wiretrace_length: int = DEFAULT_WIRETRACE_LENGTH) -> None:
         self.mainsock = None
         self.immsock = None
+        self.wiretrace = WireTrace(maxlen=wiretrace_length, logger=log)
 
     @classmethod
     def set_verbose_logging(cls, verbose: bool) -> None:
@@ -62,7 +65,7 @@ class Whisker(object):
         immport = None
         for line in self.getlines_mainsock():
             # The server has sent us a message via the main socket.
-            log.debug("SERVER: " + line)
+            # (getlines_mainsock() has recorded it in the wire trace.)
             m = re.search(r"^ImmPort: (\d+)", line)
             if m:
                 immport = m.group(1)
@@ -132,6 +135,12 @@ class Whisker(object):
                  "correctly linked.")
         return True
 
+    def dump_wire_trace(self, reason: str = "") -> None:
+        """
+        Writes the lines to/from the server since the last dump to the log.
+        """
+        self.wiretrace.dump(reason)
+
     def log_out(self) -> None:
         try:
             self.mainsock.close()
@@ -145,16 +154,15 @@ class Whisker(object):
     def send(self, s: str) -> None:
         """Send something to the server on the main socket, with a trailing
         newline."""
-        log.debug("Main socket command: " + s)
+        self.wiretrace.record_sent(s)
         socket_send(self.mainsock, s + "\n")
 
     def send_immediate(self, s: str) -> str:
         """Send a command to the server on the immediate socket, and retrieve
         its reply."""
-        log.debug("Immediate socket command: " + s)
+        self.wiretrace.record_sent(s, "imm")
         socket_sendall(self.immsock, s + "\n")
         reply = next(self.getlines_immsock())
-        log.debug("Immediate socket reply: " + reply)
         return reply
 
     def getlines_immsock(self) -> Generator[str, None, None]:
@@ -165,6 +173,7 @@ class Whisker(object):
         while not done:
             if "\n" in buf:
                 (line, buf) = buf.split("\n", 1)
+                self.wiretrace.record_received(line, "imm")
                 yield line
             else:
                 more = socket_receive(self.immsock)
@@ -173,6 +182,7 @@ class Whisker(object):
                 else:
                     buf += more
         if buf:
+            self.wiretrace.record_received(buf, "imm")
             yield buf
 
     def getlines_mainsock(self) -> Generator[str, None, None]:
@@ -182,6 +192,7 @@ class Whisker(object):
         while not done:
             if "\n" in buf:
                 (line, buf) = buf.split("\n", 1)
+                self.wiretrace.record_received(line)
                 yield line
             else:
                 more = socket_receive(self.mainsock)
@@ -190,4 +201,5 @@ class Whisker(object):
                 else:
                     buf += more
         if buf:
+            self.wiretrace.record_received(buf)
             yield buf
@@ -0,0 +1,236 @@
+#!/usr/bin/env python
+# whisker/schedule.py
+# Copyright (c) Rudolf Cardinal (rudolf@pobox.com).
+# See LICENSE for details.
+
+"""
+Pregenerated trial schedules, stored on disk.
+
+Generating a randomised schedule (e.g. with whisker.random) can take a
+while, and the worst time to do it is between the box connecting and the
+first trial. Instead, generate schedules for every subject and session in
+advance, in a batch job:
+
+    def make_schedule(subject, session, seed):
+        rng = whisker.random.derive_rng(seed, subject, session)
+        ...
+        return trials  # anything JSON can store
+
+    pregenerate_schedules("schedules.dat", ["rat1", "rat2"], range(1, 21),
+                          seeds=[1234], generator=make_schedule, jobs=8)
+
+and at session start, look one up:
+
+    with ScheduleCache("schedules.dat") as cache:
+        trials = cache.get("rat1", 7, 1234)
+
+The file is an on-disk hash table, read via mmap: a lookup reads one slot
+(or a few) and the one schedule it wants, however big the file is.
+
+Schedules are stored as JSON, so tuples come back as lists.
+
+File layout (little-endian):
+
+    header: magic, number of slots, number of schedules
+    slots: (key hash, data offset, key length, value length) per slot;
+           offset 0 means empty; linear probing
+    data: key JSON then value JSON, for each schedule
+"""
+
+from concurrent.futures import ProcessPoolExecutor
+import hashlib
+import itertools
+import json
+import logging
+import mmap
+import os
+import shutil
+import struct
+import tempfile
+from typing import Any, Callable, Iterable, List, Set, Tuple
+
+log = logging.getLogger(__name__)
+
+MAGIC = b"WHSKSCH1"
+HEADER = struct.Struct("<8sQQ")
+SLOT = struct.Struct("<QQII")
+MAX_LOAD_FACTOR = 0.5
+
+
+# =============================================================================
+# Keys
+# =============================================================================
+
+def schedule_key(subject: Any, session: Any, seed: Any) -> bytes:
+    """The stored form of a (subject, session, seed) key."""
+    return json.dumps([subject, session, seed], separators=(',', ':'),
+                      sort_keys=True).encode('utf-8')
+
+
+def key_hash(key: bytes) -> int:
+    return int.from_bytes(hashlib.sha256(key).digest()[:8], 'little')
+
+
+# =============================================================================
+# Writing
+# =============================================================================
+
+class ScheduleCacheWriter(object):
+    """
+    Writes a schedule cache file. Schedules are spooled to a temporary file
+    as they're added; close() writes the index and the data, replacing
+    any existing file at once.
+    """
+
+    def __init__(self, filename: str) -> None:
+        self.filename = filename
+        self.entries = []  # type: List[Tuple[int, int, int, int]]
+        self.keys = set()  # type: Set[bytes]
+        self.datafile = tempfile.TemporaryFile()
+        self.size = 0
+
+    def __enter__(self) -> 'ScheduleCacheWriter':
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb) -> None:
+        if exc_type is None:
+            self.close()
+        else:
+            self.datafile.close()
+
+    def add(self, subject: Any, session: Any, seed: Any,
+            schedule: Any) -> None:
+        key = schedule_key(subject, session, seed)
+        h = key_hash(key)
+        if key in self.keys:
+            raise ValueError("Duplicate schedule: {}".format(key.decode()))
+        value = json.dumps(schedule, separators=(',', ':')).encode('utf-8')
+        self.datafile.write(key)
+        self.datafile.write(value)
+        self.entries.append((h, self.size, len(key), len(value)))
+        self.keys.add(key)
+        self.size += len(key) + len(value)
+
+    def close(self) -> None:
+        n_slots = 1
+        while n_slots * MAX_LOAD_FACTOR < max(len(self.entries), 1):
+            n_slots *= 2
+        data_start = HEADER.size + n_slots * SLOT.size
+        slots = [None] * n_slots  # type: List[Tuple[int, int, int, int]]
+        for h, offset, key_len, value_len in self.entries:
+            i = h % n_slots
+            while slots[i] is not None:
+                i = (i + 1) % n_slots
+            slots[i] = (h, data_start + offset, key_len, value_len)
+        directory = os.path.dirname(os.path.abspath(self.filename))
+        fd, tempname = tempfile.mkstemp(dir=directory, suffix=".tmp")
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                f.write(HEADER.pack(MAGIC, n_slots, len(self.entries)))
+                empty = SLOT.pack(0, 0, 0, 0)
+                for slot in slots:
+                    f.write(SLOT.pack(*slot) if slot else empty)
+                self.datafile.seek(0)
+                shutil.copyfileobj(self.datafile, f)
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tempname, self.filename)
+        except BaseException:
+            os.remove(tempname)
+            raise
+        finally:
+            self.datafile.close()
+        log.info("Wrote {} schedules to {}".format(len(self.entries),
+                                                   self.filename))
+
+
+def pregenerate_schedules(
+        filename: str,
+        subjects: Iterable[Any],
+        sessions: Iterable[Any],
+        seeds: Iterable[Any],
+        generator: Callable[[Any, Any, Any], Any],
+        jobs: int = 1) -> int:
+    """
+    Calls generator(subject, session, seed) for every combination, and
+    writes the results to a schedule cache file. Returns the number of
+    schedules.
+
+    With jobs > 1, schedules are generated in that many processes (so
+    generator must be a module-level function). The file is the same either
+    way, as long as generator gets its randomness only from its arguments
+    (e.g. via whisker.random.derive_rng), not the global random state.
+    """
+    keys = list(itertools.product(subjects, sessions, seeds))
+    with ScheduleCacheWriter(filename) as writer:
+        if jobs > 1:
+            with ProcessPoolExecutor(max_workers=jobs) as executor:
+                schedules = executor.map(
+                    generator, *zip(*keys),
+                    chunksize=max(1, len(keys) // (jobs * 4)))
+                for key, schedule in zip(keys, schedules):
+                    writer.add(*key, schedule=schedule)
+        else:
+            for key in keys:
+                writer.add(*key, schedule=generator(*key))
+    return len(keys)
+
+
+# =============================================================================
+# Reading
+# =============================================================================
+
+class ScheduleCache(object):
+    """Reads schedules from a file written by ScheduleCacheWriter."""
+
+    def __init__(self, filename: str) -> None:
+        self.filename = filename
+        with open(filename, 'rb') as f:
+            self.mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, self.n_slots, self.n_schedules = HEADER.unpack_from(self.mm, 0)
+        if magic != MAGIC:
+            self.mm.close()
+            raise ValueError("Not a schedule cache file: {}".format(filename))
+
+    def __enter__(self) -> 'ScheduleCache':
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb) -> None:
+        self.close()
+
+    def close(self) -> None:
+        self.mm.close()
+
+    def __len__(self) -> int:
+        return self.n_schedules
+
+    def find(self, subject: Any, session: Any, seed: Any) -> Tuple[int, int]:
+        """Returns (offset, length) of the schedule's JSON, or (0, 0)."""
+        key = schedule_key(subject, session, seed)
+        h = key_hash(key)
+        i = h % self.n_slots
+        while True:
+            slot_h, offset, key_len, value_len = SLOT.unpack_from(
+                self.mm, HEADER.size + i * SLOT.size)
+            if not offset:
+                return 0, 0
+            if (slot_h == h and key_len == len(key) and
+                    self.mm[offset:offset + key_len] == key):
+                return offset + key_len, value_len
+            i = (i + 1) % self.n_slots
+
+    def get(self, subject: Any, session: Any, seed: Any,
+            default: Any = None) -> Any:
+        offset, length = self.find(subject, session, seed)
+        if not offset:
+            return default
+        return json.loads(self.mm[offset:offset + length].decode('utf-8'))
+
+    def __getitem__(self, key: Tuple[Any, Any, Any]) -> Any:
+        offset, length = self.find(*key)
+        if not offset:
+            raise KeyError(key)
+        return json.loads(self.mm[offset:offset + length].decode('utf-8'))
+
+    def __contains__(self, key: Tuple[Any, Any, Any]) -> bool:
+        return bool(self.find(*key)[0])
@@ -4,21 +4,24 @@
 """
 """
 
-from collections import Iterable
+import atexit
+from collections import deque, OrderedDict
 from contextlib import contextmanager
+import csv
 import datetime
 import decimal
+from functools import lru_cache
+import json
 import logging
 import os
+import sqlite3
 import sys
-from typing import (Any, Callable, Dict, Generator, Optional, TextIO, Tuple,
-                    Union)
-
-from alembic.config import Config
-# noinspection PyUnresolvedReferences
-from alembic.migration import MigrationContext
-from alembic.runtime.environment import EnvironmentContext
-from alembic.script import ScriptDirectory
+import threading
+import urllib.request
+from weakref import WeakKeyDictionary
+from typing import (Any, Callable, Dict, Generator, Iterable, List, Optional,
+                    TextIO, Tuple, TYPE_CHECKING, Union)
+
 from sqlalchemy import (
     create_engine,
     event,
@@ -29,6 +32,7 @@ from sqlalchemy import (
 from sqlalchemy.engine import Connectable  # for type hints
 from sqlalchemy.engine.base import Engine  # for type hints
 from sqlalchemy.engine.default import DefaultDialect  # for type hints
+from sqlalchemy.engine.url import make_url
 # from sqlalchemy.dialects.mysql.base import MySQLDialect
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.inspection import inspect
@@ -39,27 +43,47 @@ from sqlalchemy.orm import (
     sessionmaker,
     Query,
 )
+from sqlalchemy.orm.interfaces import MANYTOONE
+try:
+    # SQLAlchemy 1.2+: SELECT ... WHERE parent_id IN (...)
+    from sqlalchemy.orm import selectinload as relationship_bulk_loader
+except ImportError:
+    # Earlier: SELECT ... JOIN (the parent query, as a subquery)
+    from sqlalchemy.orm import subqueryload as relationship_bulk_loader
 from sqlalchemy.sql.base import Executable  # for type hints
+from sqlalchemy.sql.ddl import DDLElement
 from sqlalchemy.sql.elements import BindParameter  # for type hints
+from sqlalchemy.sql.expression import Select  # for type hints
 from sqlalchemy.sql.type_api import TypeEngine  # for type hints
 from sqlalchemy.types import (
+    BigInteger,
     DateTime,
     NullType,
     String,
     TypeDecorator,
 )
-import sqlalchemy.dialects.mssql
-import sqlalchemy.dialects.mysql
+
+if TYPE_CHECKING:
+    # Type hints only: SQLAlchemy 1.4 no longer has these names here.
+    from sqlalchemy.engine.result import ResultProxy, RowProxy
 
 from whisker.exceptions import ImproperlyConfigured
-from whisker.lang import OrderedNamespace, writeline_nl, writelines_nl
+from whisker.lang import (
+    chunks,
+    OrderedNamespace,
+    writeline_nl,
+    writelines_nl,
+)
 
 log = logging.getLogger(__name__)
 
 try:
     import arrow
+    from dateutil.tz import tzutc
+    UTC = tzutc()  # the timezone arrow uses for UTC
 except ImportError:
     arrow = None
+    UTC = None
 
 
 # =============================================================================
@@ -94,6 +118,9 @@ def get_head_revision_from_alembic(alembic_config_filename: str,
     """
     if alembic_base_dir is None:
         alembic_base_dir = os.path.dirname(alembic_config_filename)
+    # Alembic is imported when needed, not with this module (it's slow).
+    from alembic.config import Config
+    from alembic.script import ScriptDirectory
     os.chdir(alembic_base_dir)  # so the directory in the config file works
     config = Config(alembic_config_filename)
     script = ScriptDirectory.from_config(config)
@@ -104,10 +131,13 @@ def get_current_revision(database_url: str) -> str:
     """
     Ask the database what its current revision is.
     """
-    engine = create_engine(database_url)
-    conn = engine.connect()
-    mig_context = MigrationContext.configure(conn)
-    return mig_context.get_current_revision()
+    # noinspection PyUnresolvedReferences
+    from alembic.migration import MigrationContext
+    engine = get_registered_database_engine(
+        {'url': database_url, 'echo': False, 'connect_args': {}})
+    with engine.connect() as conn:
+        mig_context = MigrationContext.configure(conn)
+        return mig_context.get_current_revision()
 
 
 def get_current_and_head_revision(
@@ -136,6 +166,9 @@ def upgrade_database(alembic_config_filename: str,
     but also, in particular, site-packages/alembic/command.py
     """
 
+    from alembic.config import Config
+    from alembic.runtime.environment import EnvironmentContext
+    from alembic.script import ScriptDirectory
     if alembic_base_dir is None:
         alembic_base_dir = os.path.dirname(alembic_config_filename)
     os.chdir(alembic_base_dir)  # so the directory in the config file works
@@ -167,20 +200,120 @@ def upgrade_database(alembic_config_filename: str,
 # Functions to get SQLAlchemy database session, etc.
 # =============================================================================
 
+# Optional settings that are passed straight to create_engine():
+ENGINE_POOL_SETTINGS = [
+    'pool_size',
+    'max_overflow',
+    'pool_timeout',
+    'pool_recycle',
+    'pool_pre_ping',  # SQLAlchemy 1.2+
+]
+
+# SQLite PRAGMAs applied to every connection, by profile name.
+# https://www.sqlite.org/pragma.html
+# - WAL lets readers carry on while someone is writing, and makes writes
+#   cheaper; with synchronous=NORMAL, a power cut may lose the last
+#   transactions but won't corrupt the database.
+#   https://www.sqlite.org/wal.html
+SQLITE_HIGH_THROUGHPUT_PRAGMAS = OrderedDict([
+    ('journal_mode', 'WAL'),
+    ('synchronous', 'NORMAL'),
+    ('mmap_size', 256 * 1024 * 1024),  # bytes
+    ('cache_size', -64 * 1024),  # negative means KiB, so 64 MiB
+    ('temp_store', 'MEMORY'),
+])
+SQLITE_PROFILES = {
+    'default': OrderedDict(),
+    'high_throughput': SQLITE_HIGH_THROUGHPUT_PRAGMAS,
+}
+# PRAGMAs that can't (or needn't) be set on a read-only connection:
+SQLITE_WRITER_ONLY_PRAGMAS = ['journal_mode', 'synchronous']
+
+
+def get_sqlite_pragmas(settings: Dict[str, Any],
+                       readonly: bool = False) -> Dict[str, Any]:
+    """
+    Returns the SQLite PRAGMAs requested by the settings (see
+    get_database_engine), in order.
+    """
+    profile = settings.get('sqlite_profile') or 'default'
+    if profile not in SQLITE_PROFILES:
+        raise ValueError("Unknown sqlite_profile: {}".format(repr(profile)))
+    pragmas = OrderedDict(SQLITE_PROFILES[profile])
+    pragmas.update(settings.get('sqlite_pragmas') or {})
+    if readonly:
+        for k in SQLITE_WRITER_ONLY_PRAGMAS:
+            pragmas.pop(k, None)
+    return pragmas
+
+
+def get_sqlite_readonly_connector(database_url: str,
+                                  connect_args: Dict[str, Any] = None) \
+        -> Callable[[], sqlite3.Connection]:
+    """
+    Returns a function that opens the SQLite database file read-only (as a
+    URI with mode=ro).
+    """
+    filename = make_url(database_url).database
+    if not filename or filename == ':memory:':
+        raise ValueError("Read-only access needs an SQLite database file")
+    uri = "file:{}?mode=ro".format(
+        urllib.request.pathname2url(os.path.abspath(filename)))
+    kwargs = dict(connect_args or {})
+    # The pool, not sqlite3, stops two threads using a connection at once:
+    kwargs.setdefault('check_same_thread', False)
+
+    def connect() -> sqlite3.Connection:
+        return sqlite3.connect(uri, uri=True, **kwargs)
+
+    return connect
+
+
 def get_database_engine(settings: Dict[str, Any],
-                        unbreak_sqlite_transactions: bool = True) -> Engine:
+                        unbreak_sqlite_transactions: bool = True,
+                        sqlite_readonly: bool = False) -> Engine:
     """
     The 'settings' object used here is a dictionary with the following keys:
         url  # str
         echo  # bool
         connect_args  # a dictionary
+    and optionally:
+        any of ENGINE_POOL_SETTINGS, to configure the connection pool;
+        sqlite_profile  # a key of SQLITE_PROFILES, e.g. 'high_throughput'
+        sqlite_pragmas  # a dictionary of extra/overriding SQLite PRAGMAs
+
+    If sqlite_readonly is set and this is an SQLite database, connections
+    are opened read-only; with the WAL journal, such readers don't block
+    the writer.
+
+    This makes a new Engine (and connection pool) every time; generally you
+    want get_registered_database_engine() instead.
     """
     database_url = settings['url']
+    sqlite = database_url.startswith("sqlite:")
+    engine_kwargs = {k: settings[k] for k in ENGINE_POOL_SETTINGS
+                     if k in settings}
+    if sqlite and sqlite_readonly:
+        engine_kwargs['creator'] = get_sqlite_readonly_connector(
+            database_url, settings['connect_args'])
     engine = create_engine(database_url,
                            echo=settings['echo'],
-                           connect_args=settings['connect_args'])
-    sqlite = database_url.startswith("sqlite:")
-    if not sqlite or not unbreak_sqlite_transactions:
+                           connect_args=settings['connect_args'],
+                           **engine_kwargs)
+    if not sqlite:
+        return engine
+
+    pragmas = get_sqlite_pragmas(settings, readonly=sqlite_readonly)
+    if pragmas:
+        # noinspection PyUnusedLocal
+        @event.listens_for(engine, "connect")
+        def set_pragmas(dbapi_connection, connection_record):
+            cursor = dbapi_connection.cursor()
+            for name, value in pragmas.items():
+                cursor.execute("PRAGMA {}={}".format(name, value))
+            cursor.close()
+
+    if not unbreak_sqlite_transactions:
         return engine
 
     # Hook in events to unbreak SQLite transaction support
@@ -202,6 +335,85 @@ def get_database_engine(settings: Dict[str, Any],
     return engine
 
 
+# -----------------------------------------------------------------------------
+# Process-wide engine registry
+# -----------------------------------------------------------------------------
+# An Engine is meant to be created once per database per process; making one
+# per session means a new connection pool (and new connections) every time.
+
+_engine_registry = {}  # type: Dict[Tuple, Engine]
+_engine_registry_lock = threading.Lock()
+_engine_registry_atexit_registered = False
+
+
+def get_engine_registry_key(settings: Dict[str, Any],
+                            unbreak_sqlite_transactions: bool = True,
+                            sqlite_readonly: bool = False) -> Tuple:
+    """
+    Normalizes the settings (see get_database_engine) into a hashable key.
+    """
+    connect_args = settings.get('connect_args') or {}
+    return (
+        str(settings['url']).strip(),
+        bool(settings.get('echo', False)),
+        tuple(sorted((str(k), repr(v)) for k, v in connect_args.items())),
+        tuple((k, settings[k]) for k in ENGINE_POOL_SETTINGS if k in settings),
+        settings.get('sqlite_profile') or 'default',
+        tuple(sorted((str(k), repr(v)) for k, v in
+                     (settings.get('sqlite_pragmas') or {}).items())),
+        unbreak_sqlite_transactions,
+        sqlite_readonly,
+    )
+
+
+def get_registered_database_engine(
+        settings: Dict[str, Any],
+        unbreak_sqlite_transactions: bool = True,
+        sqlite_readonly: bool = False) -> Engine:
+    """
+    As for get_database_engine(), but returns the same Engine for the same
+    settings throughout the process. Engines are disposed of at exit, or via
+    dispose_registered_engines().
+    """
+    global _engine_registry_atexit_registered
+    key = get_engine_registry_key(settings, unbreak_sqlite_transactions,
+                                  sqlite_readonly)
+    with _engine_registry_lock:
+        engine = _engine_registry.get(key)
+        if engine is None:
+            engine = get_database_engine(settings,
+                                         unbreak_sqlite_transactions,
+                                         sqlite_readonly)
+            _engine_registry[key] = engine
+            if not _engine_registry_atexit_registered:
+                atexit.register(dispose_registered_engines)
+                _engine_registry_atexit_registered = True
+    return engine
+
+
+def dispose_registered_engines() -> None:
+    """
+    Closes the connection pools of all engines made by
+    get_registered_database_engine(), and forgets them.
+    """
+    with _engine_registry_lock:
+        engines = list(_engine_registry.values())
+        _engine_registry.clear()
+    for engine in engines:
+        engine.dispose()
+
+
+def get_readonly_database_engine(settings: Dict[str, Any]) -> Engine:
+    """
+    Returns a (registered) engine for reading only, e.g. for analysis while a
+    task is writing to the same database. For SQLite, its connections are
+    opened read-only, so (with the WAL journal; see SQLITE_PROFILES) they
+    don't get in the writer's way. For other databases, it's the usual
+    engine; use readonly sessions.
+    """
+    return get_registered_database_engine(settings, sqlite_readonly=True)
+
+
 # -----------------------------------------------------------------------------
 # Plain functions: not thread-aware; generally AVOID these
 # -----------------------------------------------------------------------------
@@ -209,7 +421,7 @@ def get_database_engine(settings: Dict[str, Any],
 # noinspection PyPep8Naming
 def get_database_session_thread_unaware(settings: Dict[str, Any]) -> Session:
     log.warning("get_database_session_thread_unaware() called")
-    engine = get_database_engine(settings)
+    engine = get_registered_database_engine(settings)
     SessionClass = sessionmaker(bind=engine)
     return SessionClass()
 
@@ -249,7 +461,7 @@ def get_database_engine_session_thread_scope(
         autoflush: bool = True) -> Tuple[Engine, Session]:
     if readonly:
         autoflush = False
-    engine = get_database_engine(settings)
+    engine = get_registered_database_engine(settings)
     session_factory = sessionmaker(bind=engine, autoflush=autoflush)
     SessionClass = scoped_session(session_factory)
     session = SessionClass()
@@ -299,8 +511,7 @@ class SqlAlchemyAttrDictMixin(object):
         Returns what looks like a plain object with the values of the
         SQLAlchemy ORM object.
         """
-        # noinspection PyUnresolvedReferences
-        columns = self.__table__.columns.keys()
+        columns = get_table_column_keys(type(self))
         values = (getattr(self, x) for x in columns)
         zipped = zip(columns, values)
         return OrderedNamespace(zipped)
@@ -321,6 +532,81 @@ class SqlAlchemyAttrDictMixin(object):
         return cls(**dictionary)
 
 
+# =============================================================================
+# Metadata caches
+# =============================================================================
+# Reflecting a table costs several queries, and asking a mapper for its
+# properties isn't free either; the ORM copy/dump functions below do it for
+# every object, so we cache the results.
+
+@lru_cache(maxsize=None)
+def get_table_column_keys(cls: type) -> Tuple[str, ...]:
+    """Returns the column keys of an ORM class's __table__."""
+    # noinspection PyUnresolvedReferences
+    return tuple(cls.__table__.columns.keys())
+
+
+_reflected_tables = WeakKeyDictionary()  # type: WeakKeyDictionary  # Engine -> {name: Table}  # noqa
+_reflected_tables_lock = threading.Lock()
+
+
+def reflect_table(engine: Engine, table_name: str) -> Table:
+    """
+    Returns the table, as reflected from the database now, with its own
+    (unbound) MetaData.
+    """
+    return Table(table_name, MetaData(), autoload_with=engine)
+
+
+def get_reflected_table(engine: Engine, table_name: str) -> Table:
+    """
+    As for reflect_table(), but cached per engine, for things that look up
+    the same table repeatedly (e.g. per ORM object). The cache doesn't know
+    about schema changes (e.g. columns that dataset adds as it goes); call
+    clear_reflected_table_cache() after them, or use reflect_table().
+    The tables don't refer to the engine, so the cache doesn't keep engines
+    alive.
+    """
+    with _reflected_tables_lock:
+        tables = _reflected_tables.setdefault(engine, {})
+        table = tables.get(table_name)
+    if table is None:
+        table = reflect_table(engine, table_name)
+        with _reflected_tables_lock:
+            table = tables.setdefault(table_name, table)
+    return table
+
+
+def clear_reflected_table_cache(engine: Engine = None) -> None:
+    """Forgets reflected tables, for one engine or all."""
+    with _reflected_tables_lock:
+        if engine is None:
+            _reflected_tables.clear()
+        else:
+            _reflected_tables.pop(engine, None)
+
+
+@lru_cache(maxsize=None)
+def get_copyable_attribute_keys(cls: type,
+                                omit_fk: bool = True) -> Tuple[str, ...]:
+    """
+    Returns the keys of the mapped attributes of an ORM class that
+    copy_sqla_object() copies: all but PKs, relationships, and (if omit_fk)
+    FKs.
+    """
+    mapper = class_mapper(cls)
+    pk_keys = set([c.key for c in mapper.primary_key])
+    rel_keys = set([c.key for c in mapper.relationships])
+    prohibited = pk_keys | rel_keys
+    if omit_fk:
+        fk_keys = set([c.key for c in mapper.columns if c.foreign_keys])
+        prohibited |= fk_keys
+    log.debug("copy_sqla_object: {}: skipping: {}".format(cls.__name__,
+                                                          prohibited))
+    return tuple(p.key for p in mapper.iterate_properties
+                 if p.key not in prohibited)
+
+
 # =============================================================================
 # Info functions
 # =============================================================================
@@ -353,28 +639,93 @@ def database_is_mysql(dbsettings: Dict[str, str]) -> bool:
 # https://groups.google.com/forum/#!topic/sqlalchemy/wb2M_oYkQdY
 # https://groups.google.com/forum/#!searchin/sqlalchemy/cascade%7Csort:date/sqlalchemy/eIOkkXwJ-Ms/JLnpI2wJAAAJ  # noqa
 
-def walk(obj) -> Generator[object, None, None]:
+BULK_LOAD_CHUNK_SIZE = 500  # max number of values in an IN clause
+
+
+def bulk_load_relationships(objects: List[object],
+                            chunk_size: int = BULK_LOAD_CHUNK_SIZE) -> None:
+    """
+    Loads the relationships of persistent ORM objects that aren't loaded
+    yet, with one query per class and chunk of chunk_size objects (SELECT
+    ... WHERE pk IN (...), plus one per relationship), rather than one lazy
+    load per object and relationship.
+
+    Only lazy='select' (the default) collections are loaded this way.
+    Many-to-one relationships are left alone, since the session usually has
+    the related object already, and other loading strategies (e.g.
+    'dynamic') can't be loaded in bulk. Objects whose classes don't have a
+    single-column primary key, or that aren't in a session, are left alone
+    too (to be lazy-loaded as usual).
+    """
+    by_mapper = OrderedDict()  # type: Dict[Tuple[Any, Session], List[Any]]
+    for obj in objects:
+        insp = inspect(obj)
+        if insp.session is None or insp.identity is None:
+            continue
+        by_mapper.setdefault((insp.mapper, insp.session), []).append(insp)
+    for (mapper, session), states in by_mapper.items():
+        if len(mapper.primary_key) != 1:
+            continue
+        keys = [r.key for r in mapper.relationships
+                if r.lazy in ('select', True) and r.direction != MANYTOONE]
+        states = [state for state in states
+                  if any(key in state.unloaded for key in keys)]
+        if len(states) < 2:
+            continue  # a lazy load is just as good
+        keys = [key for key in keys
+                if any(key in state.unloaded for state in states)]
+        pkcol = mapper.primary_key[0]
+        cls = mapper.class_
+        # Querying objects that are already in the session populates their
+        # unloaded attributes, including via these eager loaders.
+        loaders = [relationship_bulk_loader(getattr(cls, key))
+                   for key in keys]
+        pkvals = [state.identity[0] for state in states]
+        for chunk in chunks(pkvals, chunk_size):
+            session.query(cls).options(*loaders).filter(
+                pkcol.in_(chunk)).all()
+
+
+def walk_levels(obj: object, bulk_load: bool = True) \
+        -> Generator[List[object], None, None]:
+    """
+    Walks a relationship tree breadth-first from an ORM object, yielding a
+    list of newly found objects for each level (each object once). If
+    bulk_load is True, each level's relationships are loaded in bulk (see
+    bulk_load_relationships()) before it's yielded.
+    """
+    queue = deque([obj])
+    seen = set()
+    while queue:
+        level = []
+        for _ in range(len(queue)):
+            obj = queue.popleft()
+            if obj not in seen:
+                seen.add(obj)
+                level.append(obj)
+        if not level:
+            return
+        if bulk_load:
+            bulk_load_relationships(level)
+        yield level
+        for obj in level:
+            insp = inspect(obj)
+            for relationship in insp.mapper.relationships:
+                related = getattr(obj, relationship.key)
+                if relationship.uselist:
+                    queue.extend(related)
+                elif related is not None:
+                    queue.append(related)
+
+
+def walk(obj, bulk_load: bool = True) -> Generator[object, None, None]:
     """
     Starting with a SQLAlchemy ORM object, this function walks a
     relationship tree, yielding each of the objects once.
     """
     # http://docs.sqlalchemy.org/en/latest/faq/sessions.html#faq-walk-objects
-    stack = [obj]
-    seen = set()
-    while stack:
-        obj = stack.pop(0)
-        if obj in seen:
-            continue
-        else:
-            seen.add(obj)
-            yield obj
-        insp = inspect(obj)
-        for relationship in insp.mapper.relationships:
-            related = getattr(obj, relationship.key)
-            if relationship.uselist:
-                stack.extend(related)
-            elif related is not None:
-                stack.append(related)
+    for level in walk_levels(obj, bulk_load=bulk_load):
+        yield from level
 
 
 def copy_sqla_object(obj: object, omit_fk: bool = True) -> object:
@@ -385,22 +736,10 @@ def copy_sqla_object(obj: object, omit_fk: bool = True) -> object:
     attributes.
     """
     cls = type(obj)
-    mapper = class_mapper(cls)
     newobj = cls()  # not: cls.__new__(cls)
-    pk_keys = set([c.key for c in mapper.primary_key])
-    rel_keys = set([c.key for c in mapper.relationships])
-    prohibited = pk_keys | rel_keys
-    if omit_fk:
-        fk_keys = set([c.key for c in mapper.columns if c.foreign_keys])
-        prohibited |= fk_keys
-    log.debug("copy_sqla_object: skipping: {}".format(prohibited))
-    for k in [p.key for p in mapper.iterate_properties
-              if p.key not in prohibited]:
+    for k in get_copyable_attribute_keys(cls, omit_fk):
         try:
-            value = getattr(obj, k)
-            log.debug("copy_sqla_object: processing attribute {} = {}".format(
-                k, value))
-            setattr(newobj, k, value)
+            setattr(newobj, k, getattr(obj, k))
         except AttributeError:
             log.debug("copy_sqla_object: failed attribute {}".format(k))
             pass
@@ -414,17 +753,13 @@ def deepcopy_sqla_object(startobj: object, session: Session,
     arguments. (We can't specify the required args/kwargs, since we are copying
     a tree of arbitrary objects.)
     """
-    objmap = {}  # keys = old objects, values = new objects
+    objmap = OrderedDict()  # keys = old objects, values = new objects
     log.debug("deepcopy_sqla_object: pass 1: create new objects")
     # Pass 1: iterate through all objects. (Can't guarantee to get
     # relationships correct until we've done this, since we don't know whether
-    # or where the "root" of the PK tree is.)
-    stack = [startobj]
-    while stack:
-        oldobj = stack.pop(0)
-        if oldobj in objmap:  # already seen
-            continue
-        log.debug("deepcopy_sqla_object: copying {}".format(oldobj))
+    # or where the "root" of the PK tree is.) Relationships are loaded a level
+    # at a time, not one object at a time; see walk_levels().
+    for oldobj in walk(startobj):
         newobj = copy_sqla_object(oldobj)
         # Don't insert the new object into the session here; it may trigger
         # an autoflush as the relationships are queried, and the new objects
@@ -434,19 +769,10 @@ def deepcopy_sqla_object(startobj: object, session: Session,
         # invoked autoflush; consider using a session.no_autoflush block if
         # this flush is occurring prematurely)..."
         objmap[oldobj] = newobj
-        insp = inspect(oldobj)
-        for relationship in insp.mapper.relationships:
-            log.debug("deepcopy_sqla_object: ... relationship: {}".format(
-                relationship))
-            related = getattr(oldobj, relationship.key)
-            if relationship.uselist:
-                stack.extend(related)
-            elif related is not None:
-                stack.append(related)
+    log.debug("deepcopy_sqla_object: copied {} objects".format(len(objmap)))
     # Pass 2: set all relationship properties.
     log.debug("deepcopy_sqla_object: pass 2: set relationships")
     for oldobj, newobj in objmap.items():
-        log.debug("deepcopy_sqla_object: newobj: {}".format(newobj))
         insp = inspect(oldobj)
         # insp.mapper.relationships is of type
         # sqlalchemy.utils._collections.ImmutableProperties, which is basically
@@ -456,8 +782,6 @@ def deepcopy_sqla_object(startobj: object, session: Session,
             # relationship from the old object and from the new, with e.g.
             # newrel = newinsp.mapper.relationships[oldrel.key],
             # yield the same object. All we need from it is the key name.
-            log.debug("deepcopy_sqla_object: ... relationship: {}".format(
-                relationship.key))
             related_old = getattr(oldobj, relationship.key)
             if relationship.uselist:
                 related_new = [objmap[r] for r in related_old]
@@ -465,13 +789,11 @@ def deepcopy_sqla_object(startobj: object, session: Session,
                 related_new = objmap[related_old]
             else:
                 related_new = None
-            log.debug("deepcopy_sqla_object: ... ... adding: {}".format(
-                related_new))
             setattr(newobj, relationship.key, related_new)
-    # Now we can do session insert.
+    # Now we can do session insert. The flush works out the dependency order,
+    # and inserts each table's rows together.
     log.debug("deepcopy_sqla_object: pass 3: insert into session")
-    for newobj in objmap.values():
-        session.add(newobj)
+    session.add_all(list(objmap.values()))
     # Done
     log.debug("deepcopy_sqla_object: done")
     if flush:
@@ -609,9 +931,32 @@ def get_literal_query(statement: Union[Query, Executable],
         bind = statement.bind
 
     dialect = bind.dialect
-    compiler = statement._compiler(dialect)
+    # Take the compiler class from the dialect, rather than compiling the
+    # statement to find out; the compiler compiles the statement when it's
+    # created, so its string is the result.
+    if isinstance(statement, DDLElement):
+        base_compiler_class = dialect.ddl_compiler
+    else:
+        base_compiler_class = dialect.statement_compiler
+    compiler_class = get_literal_compiler_class(base_compiler_class)
+    compiler = compiler_class(dialect, statement)
+    return compiler.string + ";"
+
+
+_literal_compiler_classes = {}  # type: Dict[type, type]
 
-    class LiteralCompiler(compiler.__class__):
+
+# noinspection PyPep8Naming
+def get_literal_compiler_class(CompilerClass: type) -> type:
+    """
+    Returns a subclass of the compiler class that renders bound values as
+    literals; see get_literal_query(). Cached per compiler class.
+    """
+    LiteralCompiler = _literal_compiler_classes.get(CompilerClass)
+    if LiteralCompiler is not None:
+        return LiteralCompiler
+
+    class LiteralCompiler(CompilerClass):
         # noinspection PyMethodMayBeStatic
         def visit_bindparam(self,
                             bindparam: BindParameter,
@@ -635,27 +980,165 @@ def get_literal_query(statement: Union[Query, Executable],
             This should be implemented by subclasses using the quoting services
             of the DBAPI.
             """
-            if isinstance(value, str):
-                value = value.replace("'", "''")
-                return "'%s'" % value
-            elif value is None:
-                return "NULL"
-            elif isinstance(value, (float, int)):
-                return repr(value)
-            elif isinstance(value, decimal.Decimal):
-                return str(value)
-            elif isinstance(value, datetime.datetime):
-                return "'{}'".format(value.isoformat())
-                # return (
-                #     "TO_DATE('%s','YYYY-MM-DD HH24:MI:SS')"
-                #     % value.strftime("%Y-%m-%d %H:%M:%S")
-                # )
-            else:
-                raise NotImplementedError(
-                    "Don't know how to literal-quote value %r" % value)
+            return literal_sql_value(value)
 
-    compiler = LiteralCompiler(dialect, statement)
-    return compiler.process(statement) + ";"
+    _literal_compiler_classes[CompilerClass] = LiteralCompiler
+    return LiteralCompiler
+
+
+def literal_sql_value(value: Any) -> str:
+    """
+    Renders a Python value as an SQL literal. See get_literal_query() for
+    the caveats.
+    """
+    if isinstance(value, str):
+        value = value.replace("'", "''")
+        return "'%s'" % value
+    elif value is None:
+        return "NULL"
+    elif isinstance(value, (float, int)):
+        return repr(value)
+    elif isinstance(value, decimal.Decimal):
+        return str(value)
+    elif isinstance(value, datetime.datetime):
+        return "'{}'".format(value.isoformat())
+        # return (
+        #     "TO_DATE('%s','YYYY-MM-DD HH24:MI:SS')"
+        #     % value.strftime("%Y-%m-%d %H:%M:%S")
+        # )
+    elif isinstance(value, (datetime.date, datetime.time)):
+        return "'{}'".format(value.isoformat())
+    elif isinstance(value, bytes):
+        return "X'{}'".format(value.hex())
+    else:
+        raise NotImplementedError(
+            "Don't know how to literal-quote value %r" % value)
+
+
+def get_multirow_insert_prefix(table: Table, dialect: DefaultDialect) -> str:
+    """
+    Returns "INSERT INTO table (col1, col2, ...) VALUES", with identifiers
+    quoted for the dialect, and columns in table order.
+    """
+    preparer = dialect.identifier_preparer
+    return "INSERT INTO {table} ({columns}) VALUES".format(
+        table=preparer.format_table(table),
+        columns=", ".join(preparer.format_column(c) for c in table.columns))
+
+
+def literal_sql_string(value: str) -> str:
+    return "'" + value.replace("'", "''") + "'"
+
+
+def literal_sql_isoformat(value: Union[datetime.date, datetime.time]) -> str:
+    return "'" + value.isoformat() + "'"
+
+
+def get_literal_sql_bytes_fn(dialect: DefaultDialect) -> Callable[[bytes],
+                                                                  str]:
+    """Returns a function to render binary values for the dialect."""
+    if dialect.name == 'postgresql':
+        return lambda value: "'\\x{}'::bytea".format(value.hex())
+    if dialect.name == 'mssql':
+        return lambda value: "0x" + value.hex()
+    # SQLite, MySQL, and ANSI SQL:
+    return lambda value: "X'{}'".format(value.hex())
+
+
+def get_literal_renderer(coltype: TypeEngine,
+                         dialect: DefaultDialect) -> Callable[[Any], str]:
+    """
+    Returns a function to render values of a column of this type as SQL
+    literals. Values not of the column's Python type (or None) are passed to
+    literal_sql_value().
+    """
+    try:
+        pytype = coltype.python_type
+    except NotImplementedError:
+        return literal_sql_value
+    if issubclass(pytype, str):
+        fn = literal_sql_string
+    elif issubclass(pytype, (int, float)):
+        fn = repr
+    elif issubclass(pytype, decimal.Decimal):
+        fn = str
+    elif issubclass(pytype, (datetime.date, datetime.time)):
+        # ... includes datetime.datetime
+        fn = literal_sql_isoformat
+    elif issubclass(pytype, bytes):
+        fn = get_literal_sql_bytes_fn(dialect)
+    else:
+        return literal_sql_value
+
+    def render(value: Any) -> str:
+        if type(value) is pytype:
+            return fn(value)
+        if isinstance(value, bytes):
+            return get_literal_sql_bytes_fn(dialect)(value)
+        return literal_sql_value(value)
+
+    return render
+
+
+class LiteralInsertTemplate(object):
+    """
+    Renders rows of a table as literal INSERT statements (see
+    get_literal_query() for the caveats), with the statement prefix and the
+    per-column literal renderers worked out once. Rows are sequences of
+    values in table column order, e.g. from sql.select(table.columns).
+
+    Use get_literal_insert_template() to get a cached one.
+    """
+
+    def __init__(self, table: Table, dialect: DefaultDialect) -> None:
+        self.prefix = get_multirow_insert_prefix(table, dialect)
+        self.renderers = [get_literal_renderer(c.type, dialect)
+                          for c in table.columns]
+
+    def render_values(self, row: Iterable[Any]) -> str:
+        """Renders "(value1, value2, ...)"."""
+        return "(" + ", ".join([render(value) for render, value
+                                in zip(self.renderers, row)]) + ")"
+
+    def render_insert(self, rows: List[Iterable[Any]]) -> str:
+        """Renders a single- or multi-row INSERT statement."""
+        if len(rows) == 1:
+            return self.prefix + " " + self.render_values(rows[0]) + ";"
+        return self.prefix + "\n    " + ",\n    ".join(
+            [self.render_values(row) for row in rows]) + ";"
+
+
+_literal_insert_templates = {}  # type: Dict[Tuple, LiteralInsertTemplate]
+
+
+def get_literal_insert_template(table: Table,
+                                dialect: DefaultDialect) \
+        -> LiteralInsertTemplate:
+    """
+    Returns a LiteralInsertTemplate for the table, cached by dialect, table
+    name, and column names/types.
+    """
+    key = (
+        dialect.name,
+        table.fullname,
+        tuple((c.name, repr(c.type)) for c in table.columns),
+    )
+    template = _literal_insert_templates.get(key)
+    if template is None:
+        template = LiteralInsertTemplate(table, dialect)
+        _literal_insert_templates[key] = template
+    return template
+
+
+def iter_result_rows(
+        cursor: 'ResultProxy',
+        fetch_size: int = 1000) -> Generator['RowProxy', None, None]:
+    """Yields the rows of a result, fetching fetch_size at a time."""
+    while True:
+        rows = cursor.fetchmany(fetch_size)
+        if not rows:
+            return
+        yield from rows
 
 
 def dump_table_as_insert_sql(engine: Engine,
@@ -663,7 +1146,20 @@ def dump_table_as_insert_sql(engine: Engine,
                              fileobj: TextIO,
                              wheredict: Dict[str, Any] = None,
                              include_ddl: bool = False,
-                             multirow: bool = False) -> None:
+                             multirow: bool = False,
+                             rows_per_insert: int = 1000,
+                             fetch_size: int = 1000) -> int:
+    """
+    Writes the table's data (optionally filtered by wheredict, a dictionary
+    of column: value) as INSERT statements. Returns the number of rows.
+
+    With multirow, if the dialect supports it, rows are written in chunks of
+    rows_per_insert as INSERT ... VALUES (...), (...), ...; otherwise, one
+    INSERT per row.
+
+    Rows are fetched fetch_size at a time, via a server-side cursor where the
+    dialect supports it, so memory use doesn't depend on the table size.
+    """
     # http://stackoverflow.com/questions/5631078/sqlalchemy-print-the-actual-query  # noqa
     # http://docs.sqlalchemy.org/en/latest/faq/sqlexpressions.html
     # http://www.tylerlesmann.com/2009/apr/27/copying-databases-across-platforms-sqlalchemy/  # noqa
@@ -673,19 +1169,10 @@ def dump_table_as_insert_sql(engine: Engine,
         sql_comment("Data for table: {}".format(table_name)),
         sql_comment("Filters: {}".format(wheredict)),
     ])
-    dialect = engine.dialect
-    if not dialect.supports_multivalues_insert:
-        multirow = False
-    if multirow:
-        log.warning("dump_data_as_insert_sql: multirow parameter substitution "
-                    "not working yet")
-        multirow = False
-
     # literal_query = make_literal_query_fn(dialect)
 
-    meta = MetaData(bind=engine)
     log.debug("... retrieving schema")
-    table = Table(table_name, meta, autoload=True)
+    table = reflect_table(engine, table_name)
     if include_ddl:
         log.debug("... producing DDL")
         dump_ddl(table.metadata, dialect_name=engine.dialect.name,
@@ -703,28 +1190,76 @@ def dump_table_as_insert_sql(engine: Engine,
             col = table.columns.get(k)
             query = query.where(col == v)
     # log.debug("query: {}".format(query))
-    cursor = engine.execute(query)
-    if multirow:
-        row_dict_list = []
-        for r in cursor:
-            row_dict_list.append(dict(r))
-        # log.debug("row_dict_list: {}".format(row_dict_list))
-        statement = table.insert().values(row_dict_list)
-        # log.debug("statement: {}".format(repr(statement)))
-        # insert_str = literal_query(statement)
-        insert_str = get_literal_query(statement, bind=engine)
-        # NOT WORKING FOR MULTIROW INSERTS. ONLY SUBSTITUTES FIRST ROW.
-        writeline_nl(fileobj, insert_str)
-    else:
-        for r in cursor:
-            row_dict = dict(r)
-            statement = table.insert(values=row_dict)
-            # insert_str = literal_query(statement)
-            insert_str = get_literal_query(statement, bind=engine)
-            # log.debug("row_dict: {}".format(row_dict))
-            # log.debug("insert_str: {}".format(insert_str))
-            writeline_nl(fileobj, insert_str)
+    n_rows = dump_query_as_insert_sql(engine, table, query, fileobj,
+                                      multirow=multirow,
+                                      rows_per_insert=rows_per_insert,
+                                      fetch_size=fetch_size)
     log.debug("... done")
+    return n_rows
+
+
+def dump_query_as_insert_sql(engine: Engine,
+                             table: Table,
+                             query: Select,
+                             fileobj: TextIO,
+                             multirow: bool = False,
+                             rows_per_insert: int = 1000,
+                             fetch_size: int = 1000) -> int:
+    """
+    Writes the results of a query on sql.select(table.columns) as INSERT
+    statements into the table; see dump_table_as_insert_sql(). Returns the
+    number of rows.
+    """
+    dialect = engine.dialect
+    if not dialect.supports_multivalues_insert:
+        multirow = False
+    template = get_literal_insert_template(table, dialect)
+    n_rows = 0
+    with engine.connect() as connection:
+        cursor = connection.execution_options(stream_results=True).execute(
+            query)
+        rows = iter_result_rows(cursor, fetch_size)
+        if multirow:
+            for chunk in chunks(rows, rows_per_insert):
+                writeline_nl(fileobj, template.render_insert(chunk))
+                n_rows += len(chunk)
+        else:
+            for r in rows:
+                writeline_nl(fileobj, template.render_insert([r]))
+                n_rows += 1
+    return n_rows
+
+
+def csv_value(value: Any) -> Any:
+    """Converts a value for csv.writer: NULL is blank; dates are ISO-8601."""
+    if value is None:
+        return ""
+    if isinstance(value, (datetime.date, datetime.time)):
+        return value.isoformat()
+    if isinstance(value, bytes):
+        return value.hex()
+    return value
+
+
+def dump_query_as_csv(engine: Engine,
+                      table: Table,
+                      query: Select,
+                      fileobj: TextIO,
+                      fetch_size: int = 1000) -> int:
+    """
+    Writes the results of a query on sql.select(table.columns) as CSV, with
+    a header row. Returns the number of rows.
+    """
+    writer = csv.writer(fileobj)
+    writer.writerow(table.columns.keys())
+    n_rows = 0
+    with engine.connect() as connection:
+        cursor = connection.execution_options(stream_results=True).execute(
+            query)
+        for chunk in chunks(iter_result_rows(cursor, fetch_size), fetch_size):
+            writer.writerows([csv_value(v) for v in row] for row in chunk)
+            n_rows += len(chunk)
+    return n_rows
 
 
 def dump_orm_object_as_insert_sql(engine: Engine,
@@ -742,10 +1277,9 @@ def dump_orm_object_as_insert_sql(engine: Engine,
     # Do this instead. The method above gives you fancy data types like list
     # and Arrow on the Python side. We want the bog-standard datatypes drawn
     # from the database itself.
-    meta = MetaData(bind=engine)
     table_name = insp.mapper.mapped_table.name
     # log.debug("table_name: {}".format(table_name))
-    table = Table(table_name, meta, autoload=True)
+    table = get_reflected_table(engine, table_name)
     # log.debug("table: {}".format(table))
 
     # NewRecord = quick_mapper(table)
@@ -759,13 +1293,9 @@ def dump_orm_object_as_insert_sql(engine: Engine,
     # log.debug("query: {}".format(query))
     cursor = engine.execute(query)
     row = cursor.fetchone()  # should only be one...
-    row_dict = dict(row)
     # log.debug("obj: {}".format(obj))
-    # log.debug("row_dict: {}".format(row_dict))
-    statement = table.insert(values=row_dict)
-    # insert_str = literal_query(statement)
-    insert_str = get_literal_query(statement, bind=engine)
-    writeline_nl(fileobj, insert_str)
+    template = get_literal_insert_template(table, engine.dialect)
+    writeline_nl(fileobj, template.render_insert([row]))
 
 
 def bulk_insert_extras(dialect_name: str,
@@ -817,66 +1347,247 @@ def dump_orm_tree_as_insert_sql(engine: Engine,
     bulk_insert_extras(engine.dialect.name, fileobj, start=False)
 
 
+# =============================================================================
+# Incremental dumps
+# =============================================================================
+# For tables that only grow, with a column whose values only go up (e.g. an
+# autoincrement PK, or an ArrowMicrosecondType timestamp set on insertion),
+# we can dump just the rows added since last time, by remembering the highest
+# value dumped (the "watermark").
+#
+# Each dump takes rows up to the maximum value at the start of the dump, so
+# rows added during the dump are left for next time. However, if rows can be
+# committed out of order (e.g. two sessions writing at once, with the one
+# that took the lower PK committing later), a row committed late may have a
+# value below the watermark, and will be missed.
+
+def dump_table_increment(engine: Engine,
+                         table_name: str,
+                         column_name: str,
+                         fileobj: TextIO,
+                         after: Any = None,
+                         output_format: str = "sql",
+                         multirow: bool = False,
+                         rows_per_insert: int = 1000,
+                         fetch_size: int = 1000) -> Tuple[int, Any]:
+    """
+    Writes the table's rows whose column_name value is greater than after
+    (or all, if after is None) as INSERT statements (output_format "sql") or
+    CSV ("csv").
+
+    Returns (number of rows, new watermark). The new watermark is the
+    highest value dumped (or after, if there were no new rows); pass it as
+    after next time.
+    """
+    if output_format not in ("sql", "csv"):
+        raise ValueError("Bad output_format: {}".format(repr(output_format)))
+    table = reflect_table(engine, table_name)
+    column = table.columns[column_name]
+    query = sql.select(table.columns)
+    if after is not None:
+        query = query.where(column > after)
+    upto = engine.execute(
+        query.with_only_columns([sql.func.max(column)])).scalar()
+    log.info("dump_table_increment: {}.{}: after {}, up to {}".format(
+        table_name, column_name, repr(after), repr(upto)))
+    if upto is None:  # nothing new
+        return 0, after
+    query = query.where(column <= upto).order_by(column)
+    if output_format == "csv":
+        n_rows = dump_query_as_csv(engine, table, query, fileobj,
+                                   fetch_size=fetch_size)
+    else:
+        writelines_nl(fileobj, [
+            sql_comment("Data for table: {}".format(table_name)),
+            sql_comment("Rows with {} > {} and <= {}".format(
+                column_name, repr(after), repr(upto))),
+        ])
+        n_rows = dump_query_as_insert_sql(engine, table, query, fileobj,
+                                          multirow=multirow,
+                                          rows_per_insert=rows_per_insert,
+                                          fetch_size=fetch_size)
+    return n_rows, upto
+
+
+def watermark_to_json(value: Any) -> Any:
+    """Encodes a watermark value (see above) for JSON."""
+    if isinstance(value, datetime.datetime):
+        if value.tzinfo is not None:
+            value = value.astimezone(datetime.timezone.utc).replace(
+                tzinfo=None)
+            return {'type': 'datetime_utc', 'value': value.isoformat()}
+        return {'type': 'datetime', 'value': value.isoformat()}
+    if isinstance(value, datetime.date):
+        return {'type': 'date', 'value': value.isoformat()}
+    if isinstance(value, decimal.Decimal):
+        return {'type': 'decimal', 'value': str(value)}
+    return value  # None, int, float, str
+
+
+def watermark_from_json(value: Any) -> Any:
+    """Reverses watermark_to_json()."""
+    if not isinstance(value, dict):
+        return value
+    t = value['type']
+    v = value['value']
+    if t in ('datetime', 'datetime_utc'):
+        fmt = "%Y-%m-%dT%H:%M:%S.%f" if "." in v else "%Y-%m-%dT%H:%M:%S"
+        dt = datetime.datetime.strptime(v, fmt)
+        if t == 'datetime_utc':
+            dt = dt.replace(tzinfo=datetime.timezone.utc)
+        return dt
+    if t == 'date':
+        return datetime.datetime.strptime(v, "%Y-%m-%d").date()
+    if t == 'decimal':
+        return decimal.Decimal(v)
+    raise ValueError("Unknown watermark type: {}".format(repr(t)))
+
+
+def load_watermarks(filename: str) -> Dict[str, Dict[str, Any]]:
+    """
+    Reads a watermark state file, returning {table name: {'column': column
+    name, 'watermark': value}}; empty if the file doesn't exist.
+    """
+    if not os.path.exists(filename):
+        return {}
+    with open(filename) as f:
+        state = json.load(f)
+    for info in state.values():
+        info['watermark'] = watermark_from_json(info['watermark'])
+    return state
+
+
+def save_watermarks(filename: str,
+                    state: Dict[str, Dict[str, Any]]) -> None:
+    """
+    Writes a watermark state file (see load_watermarks()). The file is
+    replaced atomically, so a crash mid-write leaves the old state intact.
+    """
+    serializable = {
+        table_name: {'column': info['column'],
+                     'watermark': watermark_to_json(info['watermark'])}
+        for table_name, info in state.items()
+    }
+    tmp_filename = filename + ".tmp"
+    with open(tmp_filename, 'w') as f:
+        json.dump(serializable, f, indent=4, sort_keys=True)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_filename, filename)
+
+
 # =============================================================================
 # ArrowType that uses fractional second support in MySQL
 # =============================================================================
 
+EPOCH_NAIVE_UTC = datetime.datetime(1970, 1, 1)
+ONE_MICROSECOND = datetime.timedelta(microseconds=1)
+
+
+def to_naive_utc_datetime(value: datetime.datetime) -> datetime.datetime:
+    """
+    Naive datetimes are assumed to be UTC already (as arrow.get() does), so
+    are returned as they are; aware ones are converted to naive UTC.
+    """
+    if value.tzinfo is None:
+        return value
+    return value.astimezone(datetime.timezone.utc).replace(tzinfo=None)
+
+
 class ArrowMicrosecondType(TypeDecorator):
     """
     Based on ArrowType from SQLAlchemy-Utils, but copes with fractional seconds
     under MySQL 5.6.4+.
+
+    Values are stored as naive UTC datetimes, or, if
+    store_as_epoch_microseconds is True, as integer microseconds since
+    1970-01-01 UTC (a BIGINT column; cheaper to store and compare, and the
+    same on every backend).
     """
     impl = DateTime
     # RNC: For MySQL, need to use sqlalchemy.dialects.mysql.DATETIME(fsp=6);
     # see load_dialect_impl() below.
 
-    def __init__(self, *args, **kwargs) -> None:
+    _dialect_impls = {}  # type: Dict[Tuple[type, bool], TypeEngine]
+
+    def __init__(self, *args, store_as_epoch_microseconds: bool = False,
+                 **kwargs) -> None:
         if not arrow:
             raise ImproperlyConfigured(
                 "'arrow' package is required to use 'ArrowMicrosecondType'")
+        self.store_as_epoch_microseconds = store_as_epoch_microseconds
         super().__init__(*args, **kwargs)
 
     def load_dialect_impl(self, dialect: DefaultDialect) -> TypeEngine:  # RNC
-        if dialect.name == 'mysql':
-            return dialect.type_descriptor(
-                sqlalchemy.dialects.mysql.DATETIME(fsp=6))
+        key = (type(dialect), self.store_as_epoch_microseconds)
+        impl = self._dialect_impls.get(key)
+        if impl is not None:
+            return impl
+        if self.store_as_epoch_microseconds:
+            impl = dialect.type_descriptor(BigInteger())
+        elif dialect.name == 'mysql':
+            # Dialect modules are imported when needed (i.e. once connected).
+            from sqlalchemy.dialects.mysql import DATETIME
+            impl = dialect.type_descriptor(DATETIME(fsp=6))
         elif dialect.name == 'mssql':  # Microsoft SQL Server
-            return dialect.type_descriptor(sqlalchemy.dialects.mssql.DATETIME2)
+            from sqlalchemy.dialects.mssql import DATETIME2
+            impl = dialect.type_descriptor(DATETIME2)
         else:
-            return dialect.type_descriptor(self.impl)
+            return dialect.type_descriptor(self.impl)  # may have arguments
+        self._dialect_impls[key] = impl
+        return impl
 
     def process_bind_param(
             self, value: Any,
             dialect: DefaultDialect) -> Optional[datetime.datetime]:
         if value:
-            return self._coerce(value).to('UTC').naive
+            # Fast paths first: avoid making Arrow objects.
+            if isinstance(value, datetime.datetime):
+                value = to_naive_utc_datetime(value)
+            elif isinstance(value, arrow.Arrow):
+                value = to_naive_utc_datetime(value.datetime)
+            else:
+                value = self._coerce(value).to('UTC').naive
             # RNC: unfortunately... can't store and retrieve timezone, see docs
+            if self.store_as_epoch_microseconds:
+                return (value - EPOCH_NAIVE_UTC) // ONE_MICROSECOND
         return value
 
     def process_result_value(self, value: Any,
                              dialect: DefaultDialect) -> Optional[arrow.Arrow]:
+        if value is None:
+            return value
+        if self.store_as_epoch_microseconds:
+            value = EPOCH_NAIVE_UTC + datetime.timedelta(microseconds=value)
+        if isinstance(value, datetime.datetime):
+            # What arrow.get() does, without working out what it's been given.
+            return arrow.Arrow.fromdatetime(value, value.tzinfo or UTC)
         if value:
             return arrow.get(value)
         return value
 
     def process_literal_param(self, value: Any, dialect: DefaultDialect) -> str:
+        if self.store_as_epoch_microseconds:
+            return str(self.process_bind_param(value, dialect))
         return str(value)
 
     # noinspection PyMethodMayBeStatic
     def _coerce(self, value: Any) -> Optional[arrow.Arrow]:
-        if value is None:
-            return None
+        if value is None or isinstance(value, arrow.Arrow):
+            return value
         elif isinstance(value, str):  # RNC
             value = arrow.get(value)
-        elif isinstance(value, Iterable):
-            value = arrow.get(*value)
         elif isinstance(value, datetime.datetime):  # RNC trivial change
             value = arrow.get(value)
+        elif isinstance(value, Iterable):
+            value = arrow.get(*value)
         return value
 
     # noinspection PyUnusedLocal
     def coercion_listener(self, target, value, oldvalue,
                           initiator) -> Optional[arrow.Arrow]:
+        if value is None or type(value) is arrow.Arrow:
+            return value
         return self._coerce(value)
 
     @property
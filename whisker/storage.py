@@ -0,0 +1,554 @@
+#!/usr/bin/env python
+# whisker/storage.py
+# Copyright (c) Rudolf Cardinal (rudolf@pobox.com).
+# See LICENSE for details.
+
+"""
+Write-behind storage of trial data.
+
+Inserting a row per event, in its own transaction, from within an event
+callback (e.g. with dataset, as in the demo task) means that the task stalls
+for every commit; with SQLite, that is a disk sync per row. A TrialWriter
+takes rows from the task without blocking, and a background thread writes
+them in batches (one transaction per batch; one executemany per table).
+
+Usage:
+
+    writer = TrialWriter(db)  # a dataset Database or an SQLAlchemy Engine
+    writer.close_on_reactor_shutdown()  # if you're using Twisted
+    # ...
+    writer.write('trial', dict(session_id=1, trial_num=3, response=True))
+    # ...
+    writer.close()  # or flush(), to carry on writing afterwards
+
+Rows are written when batch_size rows are waiting, or flush_interval_ms after
+the first row arrived, whichever comes first, and whenever flush() or
+close() is called. The writer is also closed at exit.
+
+Rows don't get their primary keys back (use insert_and_set_id() for things
+like a session record that other rows refer to). Until flush() has returned,
+don't expect to read the rows back from the database.
+
+Rows waiting to be written are lost if the computer loses power. To avoid
+that, give the writer a journal file (one per session, say):
+
+    writer = TrialWriter(db, journal_filename="subject_x_session_y.journal")
+
+Rows are then appended to the journal (a TrialJournal) as soon as the
+background thread receives them, with one fsync for however many rows have
+arrived at once, and the journal records which rows the database has
+committed. If the task is restarted with the same journal file, rows that
+weren't committed are written to the database first. A journal is deleted
+when its writer closes with everything committed.
+
+The database may have committed a batch that the journal doesn't know about,
+if power goes between the two; those rows would be written again. Give
+trial rows a natural key (e.g. session and trial number) if that matters.
+"""
+
+import atexit
+import base64
+from collections import OrderedDict
+import datetime
+import decimal
+import json
+import logging
+import os
+import queue
+import threading
+import time
+from typing import (Any, Dict, Iterable, List, Optional, Tuple,
+                    TYPE_CHECKING)
+
+from whisker.convenience import is_arrow
+
+# arrow, dataset and SQLAlchemy are imported by the functions that need
+# them, so importing this module is quick.
+if TYPE_CHECKING:
+    from sqlalchemy.schema import Table  # for type hints
+
+log = logging.getLogger(__name__)
+log.addHandler(logging.NullHandler())
+
+DEFAULT_BATCH_SIZE = 500
+DEFAULT_FLUSH_INTERVAL_MS = 1000
+
+_STOP = object()
+
+
+# =============================================================================
+# Journal
+# =============================================================================
+
+def journal_json_default(obj: Any) -> Dict[str, Any]:
+    """
+    For json.dumps(): encodes the non-JSON types that rows commonly contain
+    as tagged dictionaries; see journal_json_object_hook().
+    """
+    if is_arrow(obj):
+        return {'__type__': 'arrow', 'value': obj.isoformat()}
+    if isinstance(obj, datetime.datetime):
+        return {'__type__': 'datetime', 'value': obj.isoformat()}
+    if isinstance(obj, datetime.date):
+        return {'__type__': 'date', 'value': obj.isoformat()}
+    if isinstance(obj, datetime.time):
+        return {'__type__': 'time', 'value': obj.isoformat()}
+    if isinstance(obj, decimal.Decimal):
+        return {'__type__': 'decimal', 'value': str(obj)}
+    if isinstance(obj, (bytes, bytearray)):
+        return {'__type__': 'bytes',
+                'value': base64.b64encode(obj).decode('ascii')}
+    raise TypeError("Can't journal {}".format(repr(obj)))
+
+
+def journal_json_object_hook(d: Dict[str, Any]) -> Any:
+    """For json.loads(): reverses journal_json_default()."""
+    t = d.get('__type__')
+    if t is None:
+        return d
+    value = d['value']
+    if t == 'arrow':
+        import arrow
+        return arrow.get(value)
+    if t == 'datetime':
+        return parse_isoformat_datetime(value)
+    if t == 'date':
+        return datetime.datetime.strptime(value, "%Y-%m-%d").date()
+    if t == 'time':
+        return parse_isoformat_datetime("1900-01-01T" + value).timetz()
+    if t == 'decimal':
+        return decimal.Decimal(value)
+    if t == 'bytes':
+        return base64.b64decode(value)
+    raise ValueError("Unknown journal type: {}".format(repr(t)))
+
+
+def parse_isoformat_datetime(value: str) -> datetime.datetime:
+    """Parses the output of datetime.isoformat(), with or without timezone."""
+    import arrow
+    dt = arrow.get(value)
+    if value[-6] in "+-" or value.endswith("Z"):
+        return dt.datetime
+    return dt.naive
+
+
+def seqs_to_ranges(seqs: Iterable[int]) -> List[List[int]]:
+    """[1, 2, 3, 7, 8] -> [[1, 3], [7, 8]]"""
+    ranges = []  # type: List[List[int]]
+    for seq in sorted(seqs):
+        if ranges and seq == ranges[-1][1] + 1:
+            ranges[-1][1] = seq
+        else:
+            ranges.append([seq, seq])
+    return ranges
+
+
+class TrialJournal(object):
+    """
+    Append-only JSON-lines file of rows destined for a database, and of which
+    of them the database has committed. Lines look like:
+
+        {"seq": 1, "table": "trial", "row": {...}}
+        {"committed": [[1, 20]]}
+
+    Not thread-safe; a TrialWriter uses it from its background thread.
+    """
+
+    def __init__(self, filename: str) -> None:
+        self.filename = filename
+        self._unconfirmed = OrderedDict()  # type: Dict[int, Tuple[str, Dict[str, Any]]]  # noqa
+        self.next_seq = 1
+        self._read()
+        self._file = open(filename, 'a', encoding='utf-8')
+
+    def _read(self) -> None:
+        if not os.path.exists(self.filename):
+            return
+        committed = set()
+        with open(self.filename, encoding='utf-8') as f:
+            content = f.read()
+        lines = content.split("\n")
+        for i, line in enumerate(lines):
+            if not line:
+                continue
+            try:
+                entry = json.loads(line, object_hook=journal_json_object_hook)
+            except ValueError:
+                # The last line is incomplete if we lost power while writing
+                # it; such rows never reached the database.
+                log.warning("Journal {}: skipping bad line {}".format(
+                    self.filename, i + 1))
+                continue
+            if 'committed' in entry:
+                for first, last in entry['committed']:
+                    committed.update(range(first, last + 1))
+            else:
+                seq = entry['seq']
+                self._unconfirmed[seq] = (entry['table'], entry['row'])
+                self.next_seq = max(self.next_seq, seq + 1)
+        for seq in committed:
+            self._unconfirmed.pop(seq, None)
+        if content and not content.endswith("\n"):
+            with open(self.filename, 'a', encoding='utf-8') as f:
+                f.write("\n")
+
+    def get_unconfirmed(self) -> List[Tuple[int, str, Dict[str, Any]]]:
+        """
+        Returns (seq, tablename, row) for rows that the database hasn't
+        committed, in order.
+        """
+        return [(seq, tablename, row)
+                for seq, (tablename, row) in self._unconfirmed.items()]
+
+    def append(self, entries: List[Tuple[str, Dict[str, Any]]]) -> List[int]:
+        """
+        Writes (tablename, row) entries to disk, with a single fsync, and
+        returns their sequence numbers.
+        """
+        seqs = []
+        lines = []
+        for tablename, row in entries:
+            seq = self.next_seq
+            self.next_seq += 1
+            lines.append(json.dumps(
+                {'seq': seq, 'table': tablename, 'row': row},
+                default=journal_json_default))
+            seqs.append(seq)
+            self._unconfirmed[seq] = (tablename, row)
+        self._write_lines(lines)
+        return seqs
+
+    def mark_committed(self, seqs: Iterable[int]) -> None:
+        """Records that the database has committed these rows."""
+        seqs = list(seqs)
+        if not seqs:
+            return
+        self._write_lines([json.dumps({'committed': seqs_to_ranges(seqs)})])
+        for seq in seqs:
+            self._unconfirmed.pop(seq, None)
+
+    def _write_lines(self, lines: List[str]) -> None:
+        self._file.write("".join(line + "\n" for line in lines))
+        self._file.flush()
+        os.fsync(self._file.fileno())
+
+    @property
+    def n_unconfirmed(self) -> int:
+        return len(self._unconfirmed)
+
+    def close(self, remove_if_complete: bool = True) -> None:
+        """
+        Closes the file, and deletes it if the database has committed
+        everything in it.
+        """
+        if self._file.closed:
+            return
+        self._file.close()
+        if remove_if_complete and not self._unconfirmed:
+            os.remove(self.filename)
+        elif self._unconfirmed:
+            log.warning("Journal {} has {} rows not yet in the "
+                        "database".format(self.filename, self.n_unconfirmed))
+
+
+# =============================================================================
+# Background writer
+# =============================================================================
+
+class TrialWriter(object):
+    """
+    Queues rows (dictionaries) for insertion into a database by a background
+    thread.
+
+    db is a dataset Database (tables and columns are created as necessary,
+    as for dataset's insert()) or an SQLAlchemy Engine (tables must exist;
+    they are reflected). For a dataset Database, the background thread opens
+    its own connection to the same URL, since dataset shares one connection
+    between threads for SQLite; so an in-memory SQLite database won't do.
+
+    If a batch can't be written, its rows are tried again one at a time (each
+    in its own transaction), so that one bad row doesn't lose the rest. Rows
+    that still can't be written are logged and kept in failed_rows (a
+    dictionary of tablename: list of rows), so the task can save them some
+    other way. (With a journal, they will also be written the next time the
+    journal is used.)
+
+    With a dataset Database, values should be None, bool, int, float, str,
+    datetime.date, datetime.datetime, or dict (stored as JSON); these are what
+    dataset knows column types for. Anything else gets a text column and is
+    handed to the database driver as it is, which may refuse it (SQLite won't
+    take a decimal.Decimal or an arrow.Arrow, for example), so convert such
+    values first (e.g. with float() or str()). With an Engine, values must
+    suit the types of the reflected columns, and a row with a key that isn't
+    a column fails.
+
+    If journal_filename is given, rows are journalled first; see above.
+    """
+
+    def __init__(self, db: Any,
+                 batch_size: int = DEFAULT_BATCH_SIZE,
+                 flush_interval_ms: int = DEFAULT_FLUSH_INTERVAL_MS,
+                 name: str = "TrialWriter",
+                 journal_filename: str = None) -> None:
+        self.db = db
+        self.batch_size = batch_size
+        self.flush_interval_s = flush_interval_ms / 1000
+        self.name = name
+        self.rows_written = 0
+        self.failed_rows = OrderedDict()  # type: Dict[str, List[Dict[str, Any]]]  # noqa
+        # If db is an Engine, SQLAlchemy has been imported already.
+        from sqlalchemy.engine import Engine
+        self._is_engine = isinstance(db, Engine)
+        if not self._is_engine and db.engine.url.database in ('', None,
+                                                              ':memory:'):
+            raise ValueError("TrialWriter needs a database file, not an "
+                             "in-memory SQLite database")
+        self._writer_db = None  # dataset Database for the background thread
+        self.journal = None  # type: TrialJournal
+        if journal_filename:
+            self.journal = TrialJournal(journal_filename)
+        self._tables = {}  # type: Dict[str, 'Table']
+        self._queue = queue.Queue()
+        self._closed = False
+        self._close_lock = threading.Lock()
+        self._thread = threading.Thread(target=self._run, name=name,
+                                        daemon=True)
+        self._thread.start()
+        atexit.register(self.close)
+
+    # -------------------------------------------------------------------------
+    # Interface for the task
+    # -------------------------------------------------------------------------
+
+    def write(self, tablename: str, row: Dict[str, Any]) -> None:
+        """
+        Queues a row for insertion; doesn't block. The row is copied, so the
+        caller may go on to modify it.
+        """
+        if self._closed:
+            raise RuntimeError("{}: write() after close()".format(self.name))
+        self._queue.put((tablename, dict(row)))
+
+    def flush(self, timeout: float = None) -> bool:
+        """
+        Waits until everything queued so far has been written (or has
+        failed). Returns False if the timeout (in seconds) expired first.
+        """
+        if not self._thread.is_alive():
+            return True
+        done = threading.Event()
+        self._queue.put(done)
+        return done.wait(timeout)
+
+    def close(self, timeout: float = None) -> None:
+        """
+        Writes everything queued, and stops the background thread. Safe to
+        call more than once.
+        """
+        with self._close_lock:
+            if self._closed:
+                return
+            self._closed = True
+        atexit.unregister(self.close)
+        self._queue.put(_STOP)
+        self._thread.join(timeout)
+        if self._thread.is_alive():
+            log.critical("{}: timed out writing data".format(self.name))
+        if self.failed_rows:
+            log.critical("{}: rows not written: {}".format(
+                self.name,
+                ", ".join("{} to {}".format(len(rows), tablename)
+                          for tablename, rows in self.failed_rows.items())))
+
+    def close_on_reactor_shutdown(self, reactor: Any = None) -> None:
+        """
+        Makes the Twisted reactor close the writer when it stops (e.g. via
+        reactor.stop()).
+        """
+        if reactor is None:
+            from twisted.internet import reactor
+        reactor.addSystemEventTrigger('before', 'shutdown', self.close)
+
+    # -------------------------------------------------------------------------
+    # Background thread
+    # -------------------------------------------------------------------------
+
+    def _run(self) -> None:
+        if not self._is_engine:
+            import dataset
+            self._writer_db = dataset.connect(self.db.url,
+                                              schema=self.db.schema)
+        try:
+            self._process_queue()
+        finally:
+            if self._writer_db is not None:
+                self._writer_db.executable.close()
+            if self.journal is not None:
+                self.journal.close()
+
+    def _process_queue(self) -> None:
+        pending = OrderedDict()  # type: Dict[str, List[Dict[str, Any]]]
+        n_pending = 0
+        seqs = OrderedDict()  # type: Dict[str, List[Optional[int]]]
+        # ... journal numbers of pending rows, by table (None if unjournalled)
+        deadline = None
+        if self.journal is not None and self.journal.n_unconfirmed:
+            log.warning("{}: writing {} rows left over in {}".format(
+                self.name, self.journal.n_unconfirmed,
+                self.journal.filename))
+            for seq, tablename, row in self.journal.get_unconfirmed():
+                pending.setdefault(tablename, []).append(row)
+                seqs.setdefault(tablename, []).append(seq)
+                n_pending += 1
+            deadline = time.monotonic()
+        while True:
+            if deadline is None:
+                timeout = None
+            else:
+                timeout = max(0.0, deadline - time.monotonic())
+            # Take whatever rows have arrived (up to a batch), stopping at
+            # any flush/stop request.
+            rows = []  # type: List[Tuple[str, Dict[str, Any]]]
+            control = None
+            try:
+                item = self._queue.get(timeout=timeout)
+                while isinstance(item, tuple):
+                    rows.append(item)
+                    if len(rows) >= self.batch_size:
+                        item = None
+                        break
+                    item = self._queue.get_nowait()
+                control = item
+            except queue.Empty:
+                pass
+            if rows:
+                if self.journal is not None:
+                    row_seqs = self._journal_rows(rows)
+                else:
+                    row_seqs = [None] * len(rows)
+                for (tablename, row), seq in zip(rows, row_seqs):
+                    pending.setdefault(tablename, []).append(row)
+                    seqs.setdefault(tablename, []).append(seq)
+                n_pending += len(rows)
+                if deadline is None:
+                    deadline = time.monotonic() + self.flush_interval_s
+            if (control is None and n_pending < self.batch_size and
+                    deadline is not None and time.monotonic() < deadline):
+                continue
+            if pending:
+                self._write_batch(pending, seqs)
+                pending = OrderedDict()
+                n_pending = 0
+                seqs = OrderedDict()
+            deadline = None
+            if isinstance(control, threading.Event):
+                control.set()
+            elif control is _STOP:
+                return
+
+    def _journal_rows(
+            self,
+            rows: List[Tuple[str, Dict[str, Any]]]) -> List[Optional[int]]:
+        try:
+            return self.journal.append(rows)
+        except Exception:
+            log.exception("{}: failed to journal {} rows".format(
+                self.name, len(rows)))
+            return [None] * len(rows)
+
+    def _write_batch(self, pending: Dict[str, List[Dict[str, Any]]],
+                     seqs: Dict[str, List[Optional[int]]]) -> None:
+        n_rows = sum(len(rows) for rows in pending.values())
+        try:
+            self._write_rows(pending)
+        except Exception:
+            log.exception("{}: failed to write {} rows; trying them one at a "
+                          "time".format(self.name, n_rows))
+            self._write_rows_singly(pending, seqs)
+            return
+        self.rows_written += n_rows
+        log.debug("{}: wrote {} rows".format(self.name, n_rows))
+        self._mark_committed(
+            seq for table_seqs in seqs.values() for seq in table_seqs)
+
+    def _write_rows_singly(self, pending: Dict[str, List[Dict[str, Any]]],
+                           seqs: Dict[str, List[Optional[int]]]) -> None:
+        committed = []  # type: List[Optional[int]]
+        n_failed = 0
+        for tablename, rows in pending.items():
+            for row, seq in zip(rows, seqs[tablename]):
+                try:
+                    self._write_rows({tablename: [row]})
+                except Exception as e:
+                    log.error("{}: failed to write row to {}: {}: {}".format(
+                        self.name, tablename, repr(row), e))
+                    self.failed_rows.setdefault(tablename, []).append(row)
+                    n_failed += 1
+                else:
+                    committed.append(seq)
+        self.rows_written += len(committed)
+        log.debug("{}: wrote {} rows; {} failed".format(
+            self.name, len(committed), n_failed))
+        self._mark_committed(committed)
+
+    def _mark_committed(self, seqs: Iterable[Optional[int]]) -> None:
+        if self.journal is None:
+            return
+        try:
+            self.journal.mark_committed(seq for seq in seqs
+                                        if seq is not None)
+        except Exception:
+            log.exception("{}: failed to update journal".format(self.name))
+
+    def _write_rows(self, pending: Dict[str, List[Dict[str, Any]]]) -> None:
+        """Writes the rows in one transaction."""
+        if self._is_engine:
+            self._write_batch_sqlalchemy(pending)
+        else:
+            self._write_batch_dataset(pending)
+
+    def _write_batch_dataset(self,
+                             pending: Dict[str, List[Dict[str, Any]]]) -> None:
+        # Create any new tables/columns first; dataset doesn't like schema
+        # changes inside a transaction.
+        for tablename, rows in pending.items():
+            table = self._writer_db[tablename]
+            examples = OrderedDict()  # type: Dict[str, Any]
+            for row in rows:
+                for k, v in row.items():
+                    if examples.get(k) is None:
+                        examples[k] = v
+            for k, v in examples.items():
+                if not table.has_column(k):
+                    table.create_column_by_example(k, v)
+        with self._writer_db as tx:
+            for tablename, rows in pending.items():
+                tx[tablename].insert_many(rows, chunk_size=len(rows))
+
+    def _write_batch_sqlalchemy(
+            self, pending: Dict[str, List[Dict[str, Any]]]) -> None:
+        with self.db.begin() as connection:
+            for tablename, rows in pending.items():
+                table = self._get_table(tablename)
+                # An executemany needs the same columns in every row.
+                by_columns = OrderedDict()
+                for row in rows:
+                    by_columns.setdefault(frozenset(row), []).append(row)
+                # SQLAlchemy would silently ignore keys that aren't columns.
+                columns = set(table.columns.keys())
+                for keys in by_columns:
+                    unknown = keys - columns
+                    if unknown:
+                        raise ValueError("Not columns of {}: {}".format(
+                            tablename, ", ".join(sorted(unknown))))
+                for same_columns in by_columns.values():
+                    connection.execute(table.insert(), same_columns)
+
+    def _get_table(self, tablename: str) -> 'Table':
+        table = self._tables.get(tablename)
+        if table is None:
+            from sqlalchemy.schema import MetaData, Table
+            table = Table(tablename, MetaData(), autoload=True,
+                          autoload_with=self.db)
+            self._tables[tablename] = table
+        return table
@@ -40,6 +40,7 @@ from whisker.socket import (
     socket_receive,
     socket_sendall,
 )
+from whisker.wiretrace import DEFAULT_WIRETRACE_LENGTH, WireTrace
 
 log = logging.getLogger(__name__)
 log.addHandler(logging.NullHandler())
@@ -52,13 +53,15 @@ log.addHandler(logging.NullHandler())
 class WhiskerTask(object):
     """Usage: see test_twisted.py."""
 
-    def __init__(self) -> None:
+    def __init__(self,
+                 wiretrace_length: int = DEFAULT_WIRETRACE_LENGTH) -> None:
         self.server = None
         self.mainport = None
         self.immport = None
         self.code = None
         self.mainsocket = None
         self.immsocket = None
+        self.wiretrace = WireTrace(maxlen=wiretrace_length, logger=log)
         self.mainfactory = WhiskerMainPortFactory(self)
         self.whisker = WhiskerApi(
             whisker_immsend_get_reply_fn=self.send_and_get_reply)
@@ -114,6 +117,12 @@ class WhiskerTask(object):
         """Override this."""
         pass
 
+    def dump_wire_trace(self, reason: str = "") -> None:
+        """
+        Writes the lines to/from the server since the last dump to the log.
+        """
+        self.wiretrace.dump(reason)
+
     def send(self, *args) -> None:
         if not self.mainsocket:
             log.error("can't send without a mainsocket")
@@ -193,10 +202,12 @@ class WhiskerTask(object):
             return
 
         if msg.startswith(SYNTAX_ERROR_PREFIX):
+            self.dump_wire_trace("syntax error from server")
             self.incoming_syntax_error(msg)
             return
 
         if msg.startswith(ERROR_PREFIX):
+            self.dump_wire_trace("error from server")
             self.incoming_error(msg)
             return
 
@@ -263,6 +274,7 @@ class WhiskerMainPortFactory(ClientFactory):
     def clientConnectionLost(self, connector: Connector, reason: str) -> None:
         """If we get disconnected, reconnect to server."""
         log.warning("WhiskerMainPortFactory: disconnected")
+        self.task.dump_wire_trace("disconnected")
         connector.connect()
 
     def clientConnectionFailed(self, connector: Connector, reason: str) -> None:
@@ -304,11 +316,11 @@ class WhiskerMainPortProtocol(LineReceiver):
 
     def lineReceived(self, data: bytes) -> None:
         str_data = data.decode(self.encoding)
-        log.debug("Main port received: {}".format(str_data))
+        self.task.wiretrace.record_received(str_data)
         self.task.incoming_message(str_data)
 
     def send(self, data: str) -> None:
-        log.debug("Main port sending: {}".format(data))
+        self.task.wiretrace.record_sent(data)
         self.sendLine(data.encode(self.encoding))
 
     def rawDataReceived(self, data: bytes) -> None:
@@ -366,8 +378,8 @@ class WhiskerImmSocket(object):
 
     def send_and_get_reply(self, *args) -> str:
         msg = msg_from_args(*args)
-        log.debug("Immediate socket sending: " + msg)
+        self.task.wiretrace.record_sent(msg, "imm")
         socket_sendall(self.immsock, msg + "\n")
         reply = next(self.getlines_immsock())
-        log.debug("Immediate socket reply: " + reply)
+        self.task.wiretrace.record_received(reply, "imm")
         return reply
@@ -0,0 +1,120 @@
+#!/usr/bin/env python
+# whisker/wiretrace.py
+# Copyright (c) Rudolf Cardinal (rudolf@pobox.com).
+# See LICENSE for details.
+
+"""
+In-memory record of the most recent lines sent to/received from the Whisker
+server.
+
+Logging every protocol line at DEBUG level is too expensive to leave on in
+production, but without it there is nothing to look at when something goes
+wrong. A WireTrace keeps the last N lines in each direction, with timestamps,
+at the cost of a deque append per line; dump() writes them to the log, e.g.
+on a server error or a disconnection. Each dump writes only the lines since
+the previous one, so a run of errors doesn't log the same lines repeatedly.
+"""
+
+from collections import deque
+import datetime
+import itertools
+import logging
+import threading
+import time
+from typing import List, Tuple
+
+log = logging.getLogger(__name__)
+
+DEFAULT_WIRETRACE_LENGTH = 1000
+
+SENT = ">>"
+RECEIVED = "<<"
+
+
+class WireTrace(object):
+    """
+    Ring buffer of the last maxlen lines in each direction.
+
+    Appending is thread-safe (deque.append is atomic), so one WireTrace can be
+    shared by objects in different threads (e.g. the main and immediate
+    socket handlers of the Qt client).
+
+    If a logger is given, lines are also sent to it at DEBUG level, but only
+    when that level is enabled (so the message isn't formatted otherwise).
+    """
+
+    def __init__(self, maxlen: int = DEFAULT_WIRETRACE_LENGTH,
+                 logger: logging.Logger = None) -> None:
+        self.sent = deque(maxlen=maxlen)
+        self.received = deque(maxlen=maxlen)
+        self.logger = logger
+        # Entries are numbered (next() on a count is atomic, too), so dump()
+        # can tell which it has written already.
+        self._seq = itertools.count(1)
+        self._last_dumped = 0
+        self._dump_lock = threading.Lock()
+
+    def record_sent(self, line: str, port: str = "main") -> None:
+        self.sent.append((next(self._seq), time.time(), port, line))
+        if self.logger and self.logger.isEnabledFor(logging.DEBUG):
+            self.logger.debug("Sending ({}): {}".format(port, line))
+
+    def record_received(self, line: str, port: str = "main") -> None:
+        self.received.append((next(self._seq), time.time(), port, line))
+        if self.logger and self.logger.isEnabledFor(logging.DEBUG):
+            self.logger.debug("Received ({}): {}".format(port, line))
+
+    def _get_numbered_entries(
+            self, after: int = 0) -> List[Tuple[int, float, str, str, str]]:
+        # deque.copy() is atomic, so it's safe with other threads appending.
+        entries = (
+            [(n, t, SENT, p, line)
+             for n, t, p, line in self.sent.copy() if n > after] +
+            [(n, t, RECEIVED, p, line)
+             for n, t, p, line in self.received.copy() if n > after]
+        )
+        entries.sort(key=lambda e: e[0])
+        return entries
+
+    def get_entries(self) -> List[Tuple[float, str, str, str]]:
+        """
+        Returns (time, direction, port, line) tuples for both directions,
+        in order. Direction is SENT or RECEIVED.
+        """
+        return [e[1:] for e in self._get_numbered_entries()]
+
+    def get_lines(self) -> List[str]:
+        """Returns the trace as printable lines."""
+        return [format_entry(*e) for e in self.get_entries()]
+
+    def dump(self, reason: str = "",
+             logger: logging.Logger = None,
+             level: int = logging.WARNING,
+             everything: bool = False) -> None:
+        """
+        Writes the lines recorded since the last dump (or, if everything is
+        True, the whole trace) to the log, as a single record.
+        """
+        logger = logger or self.logger or log
+        with self._dump_lock:
+            after = 0 if everything else self._last_dumped
+            entries = self._get_numbered_entries(after)
+            if entries:
+                self._last_dumped = max(self._last_dumped, entries[-1][0])
+        logger.log(level, "Whisker wire trace{} ({} {}lines){}{}".format(
+            ": " + reason if reason else "",
+            len(entries),
+            "new " if after else "",
+            ":\n" if entries else "",
+            "\n".join(format_entry(*e[1:]) for e in entries)))
+
+    def clear(self) -> None:
+        self.sent.clear()
+        self.received.clear()
+
+
+def format_entry(t: float, direction: str, port: str, line: str) -> str:
+    """Formats a (time, direction, port, line) entry as a printable line."""
+    when = datetime.datetime.fromtimestamp(t)
+    return "{} {} {}: {}".format(
+        when.strftime("%H:%M:%S.%f")[:-3], direction, port, line)